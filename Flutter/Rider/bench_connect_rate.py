@@ -0,0 +1,128 @@
+"""
+Connection-rate benchmark for forward.py --workers.
+
+Runs a local asyncio echo server, starts forward.py with each requested
+worker count, and hammers it from several client processes that each
+connect, send a short request, read the echo and disconnect in a loop.
+
+Usage: python bench_connect_rate.py [--workers 1 2 4] [--clients 8] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+FORWARD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'forward.py')
+PAYLOAD = b'GET / HTTP/1.0\r\n\r\n'
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def echo(reader, writer):
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def run_echo_server(port):
+    async def serve():
+        server = await asyncio.start_server(echo, '127.0.0.1', port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+
+def wait_for_port(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def client_loop(port, duration):
+    """Return (completed, failed) request/response round trips."""
+    completed = failed = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=5.0) as conn:
+                conn.sendall(PAYLOAD)
+                received = 0
+                while received < len(PAYLOAD):
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+            if received == len(PAYLOAD):
+                completed += 1
+            else:
+                failed += 1
+        except OSError:
+            failed += 1
+    return completed, failed
+
+
+def run_case(workers, extra_args, remote_port, clients, duration):
+    local_port = free_port()
+    cmd = [sys.executable, FORWARD_SCRIPT, str(local_port), '127.0.0.1', str(remote_port),
+           '--workers', str(workers), '--backlog', '1024', '--drain-timeout', '1'] + extra_args
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(local_port):
+            print(f"{workers:>7}  relay failed to start")
+            return
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.starmap(client_loop, [(local_port, duration)] * clients)
+        completed = sum(r[0] for r in results)
+        failed = sum(r[1] for r in results)
+        print(f"{workers:>7}  {completed / duration:12.0f}  {failed:8d}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark forward.py connections per second')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to compare')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent client processes')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per case')
+    parser.add_argument('--mode', choices=['asyncio', 'threaded'], default='asyncio', help='Relay engine to test')
+    args = parser.parse_args()
+
+    remote_port = free_port()
+    echo_server = multiprocessing.Process(target=run_echo_server, args=(remote_port,), daemon=True)
+    echo_server.start()
+    if not wait_for_port(remote_port):
+        sys.exit("Echo server failed to start")
+
+    print(f"{args.clients} client process(es), {args.duration:.0f}s per case, {args.mode} relay")
+    print(f"{'workers':>7}  {'conns/sec':>12}  {'failed':>8}")
+    for workers in args.workers:
+        run_case(workers, ['--mode', args.mode], remote_port, args.clients, args.duration)
+
+    echo_server.terminate()
+
+
+if __name__ == '__main__':
+    main()
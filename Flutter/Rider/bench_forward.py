@@ -0,0 +1,137 @@
+"""
+Throughput benchmark for forward.py data paths.
+
+Starts a local source server that streams a fixed payload, runs forward.py
+in a subprocess for each data path, and measures how fast a client can
+drain the payload through the relay.
+
+Usage: python bench_forward.py [--size-mb 256] [--streams 4] [--buffer-size 65536]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+FORWARD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'forward.py')
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_source_server(port, total_bytes, chunk_size=1 << 20):
+    """Serve `total_bytes` of zeros to every client, then close."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(128)
+    chunk = memoryview(bytes(chunk_size))
+
+    def serve(conn):
+        with conn:
+            remaining = total_bytes
+            try:
+                while remaining > 0:
+                    n = min(remaining, chunk_size)
+                    conn.sendall(chunk[:n])
+                    remaining -= n
+            except OSError:
+                pass  # Readiness probes disconnect immediately
+
+    def accept_loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server
+
+
+def wait_for_port(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def drain(port, expected, results, index):
+    buf = bytearray(1 << 20)
+    received = 0
+    with socket.create_connection(('127.0.0.1', port)) as conn:
+        while True:
+            n = conn.recv_into(buf)
+            if n == 0:
+                break
+            received += n
+    results[index] = received == expected
+
+
+def run_case(label, extra_args, remote_port, per_stream, streams):
+    local_port = free_port()
+    cmd = [sys.executable, FORWARD_SCRIPT, str(local_port), '127.0.0.1', str(remote_port)] + extra_args
+    # Relay output goes to /dev/null so terminal speed does not skew the numbers
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(local_port):
+            print(f"{label:<28} relay failed to start")
+            return
+        results = [False] * streams
+        threads = [threading.Thread(target=drain, args=(local_port, per_stream, results, i))
+                   for i in range(streams)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        total_mb = per_stream * streams / (1 << 20)
+        status = "ok" if all(results) else "TRUNCATED"
+        print(f"{label:<28} {total_mb / elapsed:10.1f} MB/s  {elapsed:7.2f} s  {status}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark forward.py data paths')
+    parser.add_argument('--size-mb', type=int, default=256, help='Payload per stream in MB')
+    parser.add_argument('--streams', type=int, default=4, help='Concurrent tunnels')
+    parser.add_argument('--buffer-size', type=int, default=65536, help='Buffer size for the new data paths')
+    args = parser.parse_args()
+
+    per_stream = args.size_mb << 20
+    remote_port = free_port()
+    server = start_source_server(remote_port, per_stream)
+
+    bufsize = str(args.buffer_size)
+    cases = [
+        ("threaded copy 4KB (legacy)", ['--mode', 'threaded', '--copy-mode', 'copy', '--buffer-size', '4096']),
+        (f"threaded recv_into {args.buffer_size}", ['--mode', 'threaded', '--copy-mode', 'recv_into', '--buffer-size', bufsize]),
+    ]
+    if hasattr(os, 'splice'):
+        cases.append((f"threaded splice {args.buffer_size}", ['--mode', 'threaded', '--copy-mode', 'splice', '--buffer-size', bufsize]))
+    cases.append((f"asyncio {args.buffer_size}", ['--mode', 'asyncio', '--buffer-size', bufsize]))
+
+    print(f"{args.streams} stream(s) x {args.size_mb} MB")
+    print("-" * 60)
+    for label, extra in cases:
+        run_case(label, extra, remote_port, per_stream, args.streams)
+
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,782 @@
-
+import argparse
+import asyncio
+import bisect
+import itertools
+import os
+import signal
 import socket
 import threading
+import time
+import traceback
 import sys
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# fcntl.F_SETPIPE_SZ is only exported on Python 3.10+; the value is Linux's.
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+BUFFER_SIZE = 65536
+SPLICE_AVAILABLE = hasattr(os, 'splice')
+COPY_MODES = ['splice', 'recv_into', 'copy']
+
+# Log every Nth chunk per direction; 0 keeps the data path silent (--log-chunks)
+LOG_CHUNKS_EVERY = 0
+
+def default_copy_mode():
+    return 'splice' if SPLICE_AVAILABLE else 'recv_into'
+
+def log_chunk(stats, name, n):
+    stats.chunks += 1
+    if LOG_CHUNKS_EVERY and stats.chunks % LOG_CHUNKS_EVERY == 0:
+        print(f"Forwarding {n} bytes via {name} (chunk {stats.chunks}, {stats.bytes} bytes total)")
+
+def copy_splice(source, destination, name, buffer_size, stats):
+    """Move bytes kernel-side: socket -> pipe -> socket, never touching userspace."""
+    pipe_r, pipe_w = os.pipe()
+    try:
+        try:
+            fcntl.fcntl(pipe_w, F_SETPIPE_SZ, buffer_size)
+        except OSError:
+            pass  # Keep the default pipe size if the kernel refuses
+        src_fd = source.fileno()
+        dst_fd = destination.fileno()
+        while True:
+            pending = os.splice(src_fd, pipe_w, buffer_size, flags=os.SPLICE_F_MOVE)
+            if pending == 0:
+                print(f"Connection {name} closed by source")
+                break
+            stats.bytes += pending
+            log_chunk(stats, name, pending)
+            while pending:
+                pending -= os.splice(pipe_r, dst_fd, pending, flags=os.SPLICE_F_MOVE)
+    finally:
+        os.close(pipe_r)
+        os.close(pipe_w)
+
+def copy_recv_into(source, destination, name, buffer_size, stats):
+    """Read into one reused buffer instead of allocating a bytes object per chunk."""
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    while True:
+        n = source.recv_into(buf)
+        if n == 0:
+            print(f"Connection {name} closed by source")
+            break
+        stats.bytes += n
+        log_chunk(stats, name, n)
+        destination.sendall(view[:n])
+
+def copy_bytes(source, destination, name, buffer_size, stats):
+    """Original copy loop: one new bytes object per recv."""
+    while True:
+        data = source.recv(buffer_size)
+        if len(data) == 0:
+            print(f"Connection {name} closed by source")
+            break
+        stats.bytes += len(data)
+        log_chunk(stats, name, len(data))
+        destination.sendall(data)
+
+COPY_FUNCTIONS = {
+    'splice': copy_splice,
+    'recv_into': copy_recv_into,
+    'copy': copy_bytes,
+}
+
+def forward(source, destination, name, copy_mode, buffer_size, stats, metrics):
+    """Copy one direction until EOF, then half-close the destination's write side.
+
+    The sockets stay open so the other direction can finish; the caller
+    closes both once both directions are done.
+    """
+    try:
+        COPY_FUNCTIONS[copy_mode](source, destination, name, buffer_size, stats)
+        try:
+            destination.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+    except Exception as e:
+        metrics.error('forward')
+        print(f"Forwarding error in {name}: {e}")
+        # shutdown() wakes the opposite thread if it is blocked in recv on
+        # one of these sockets; a broken tunnel can't finish either way
+        for sock in (source, destination):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+class DirectionStats:
+    """Byte and chunk counts for one direction of one tunnel.
+
+    Only the thread/task relaying that direction writes to it, so the data
+    path never takes a lock; Metrics reads the counts when scraped.
+    """
+
+    __slots__ = ('bytes', 'chunks')
+
+    def __init__(self):
+        self.bytes = 0
+        self.chunks = 0
+
+class Tunnel:
+    __slots__ = ('id', 'client', 'backend', 'opened_at', 'up', 'down')
+
+    def __init__(self, tunnel_id, client, backend):
+        self.id = tunnel_id
+        self.client = client
+        self.backend = backend
+        self.opened_at = time.monotonic()
+        self.up = DirectionStats()    # client->remote
+        self.down = DirectionStats()  # remote->client
+
+class Metrics:
+    """Relay counters rendered in Prometheus text format for /metrics."""
+
+    CONNECT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, balancer):
+        self.balancer = balancer
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.open_tunnels = {}
+        self.tunnels_total = 0
+        self.closed_bytes = {'client->remote': 0, 'remote->client': 0}
+        self.errors = Counter()
+        # Per backend: one count per bucket plus a final +Inf slot
+        self.connect_counts = {b: [0] * (len(self.CONNECT_BUCKETS) + 1) for b in balancer.backends}
+        self.connect_sum = {b: 0.0 for b in balancer.backends}
+
+    def open_tunnel(self, client, backend):
+        tunnel = Tunnel(next(self.ids), client, backend)
+        with self.lock:
+            self.open_tunnels[tunnel.id] = tunnel
+            self.tunnels_total += 1
+        return tunnel
+
+    def close_tunnel(self, tunnel):
+        with self.lock:
+            del self.open_tunnels[tunnel.id]
+            self.closed_bytes['client->remote'] += tunnel.up.bytes
+            self.closed_bytes['remote->client'] += tunnel.down.bytes
+        duration = time.monotonic() - tunnel.opened_at
+        print(f"Tunnel {tunnel.id} {tunnel.client} <-> {tunnel.backend} closed after {duration:.1f}s: "
+              f"{tunnel.up.bytes} bytes up, {tunnel.down.bytes} bytes down")
+
+    def observe_connect(self, backend, seconds):
+        index = bisect.bisect_left(self.CONNECT_BUCKETS, seconds)
+        with self.lock:
+            self.connect_counts[backend][index] += 1
+            self.connect_sum[backend] += seconds
+
+    def error(self, kind):
+        with self.lock:
+            self.errors[kind] += 1
+
+    def render(self):
+        with self.lock:
+            tunnels = list(self.open_tunnels.values())
+            closed_bytes = dict(self.closed_bytes)
+            tunnels_total = self.tunnels_total
+            errors = dict(self.errors)
+            connect_counts = {b: list(c) for b, c in self.connect_counts.items()}
+            connect_sum = dict(self.connect_sum)
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric('forward_bytes_total', 'counter', 'Bytes relayed by direction.', [
+            ({'direction': 'client->remote'}, closed_bytes['client->remote'] + sum(t.up.bytes for t in tunnels)),
+            ({'direction': 'remote->client'}, closed_bytes['remote->client'] + sum(t.down.bytes for t in tunnels)),
+        ])
+        metric('forward_tunnels_active', 'gauge', 'Tunnels currently open.', [({}, len(tunnels))])
+        metric('forward_tunnels_total', 'counter', 'Tunnels opened since start.', [({}, tunnels_total)])
+        metric('forward_tunnel_bytes', 'gauge', 'Bytes relayed so far by each open tunnel.', [
+            ({'tunnel': t.id, 'client': t.client, 'backend': t.backend, 'direction': direction}, stats.bytes)
+            for t in tunnels
+            for direction, stats in (('client->remote', t.up), ('remote->client', t.down))
+        ])
+        metric('forward_errors_total', 'counter', 'Connect and relay errors by kind.', [
+            ({'kind': kind}, count) for kind, count in sorted(errors.items())
+        ])
+
+        lines.append("# HELP forward_connect_seconds Upstream TCP connect latency.")
+        lines.append("# TYPE forward_connect_seconds histogram")
+        for backend, counts in connect_counts.items():
+            cumulative = 0
+            for bound, count in zip(self.CONNECT_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'forward_connect_seconds_bucket{{backend="{backend}",le="{bound}"}} {cumulative}')
+            lines.append(f'forward_connect_seconds_sum{{backend="{backend}"}} {connect_sum[backend]}')
+            lines.append(f'forward_connect_seconds_count{{backend="{backend}"}} {cumulative}')
+
+        backends = self.balancer.backends
+        metric('forward_backend_healthy', 'gauge', 'Whether the backend passed its last health check.', [
+            ({'backend': b}, int(b.healthy)) for b in backends
+        ])
+        metric('forward_backend_tunnels_active', 'gauge', 'Open tunnels per backend.', [
+            ({'backend': b}, b.active) for b in backends
+        ])
+        pooled = [(b, b.pool.stats()) for b in backends if b.pool]
+        if pooled:
+            metric('forward_pool_idle', 'gauge', 'Warm upstream sockets ready for use.', [
+                ({'backend': b}, stats['idle']) for b, stats in pooled
+            ])
+            metric('forward_pool_events_total', 'counter', 'Pool hits, misses and discards.', [
+                ({'backend': b, 'event': event}, stats[event])
+                for b, stats in pooled
+                for event in ('hits', 'misses', 'stale', 'expired', 'connect_errors')
+            ])
+        return "\n".join(lines) + "\n"
+
+def serve_metrics(metrics, port):
+    """Serve /metrics on localhost from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are too frequent to log
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+    return server
+
+class UpstreamPool:
+    """Keeps `size` pre-connected sockets to the remote ready for new clients.
+
+    A background thread tops the pool up and drops sockets that have been
+    idle longer than `ttl` seconds or that the remote has already closed.
+    acquire() never blocks: on a miss the caller connects as usual.
+    """
+
+    def __init__(self, remote_host, remote_port, size, ttl, connect_timeout=5.0):
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.size = size
+        self.ttl = ttl
+        self.connect_timeout = connect_timeout
+        self.idle = deque()  # (socket, connected_at)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.connect_errors = 0
+
+    def start(self):
+        threading.Thread(target=self._maintain, daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'idle': len(self.idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'expired': self.expired,
+                'connect_errors': self.connect_errors,
+            }
+
+    def acquire(self):
+        """Return a healthy pooled socket, or None if the pool is empty."""
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    self.misses += 1
+                    self.wakeup.set()
+                    return None
+                sock, connected_at = self.idle.popleft()
+            if now - connected_at > self.ttl:
+                self._discard(sock, 'expired')
+            elif not self._is_healthy(sock):
+                self._discard(sock, 'stale')
+            else:
+                with self.lock:
+                    self.hits += 1
+                self.wakeup.set()
+                return sock
+
+    def _is_healthy(self, sock):
+        """An idle upstream must have nothing to read; EOF or data means it is unusable."""
+        sock.setblocking(False)
+        try:
+            sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.setblocking(True)
+        return False
+
+    def _discard(self, sock, reason):
+        with self.lock:
+            setattr(self, reason, getattr(self, reason) + 1)
+        sock.close()
+
+    def _connect(self):
+        sock = socket.create_connection((self.remote_host, self.remote_port), timeout=self.connect_timeout)
+        sock.settimeout(None)
+        return sock
+
+    def _maintain(self):
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                kept = deque()
+                dropped = []
+                for sock, connected_at in self.idle:
+                    if now - connected_at > self.ttl:
+                        dropped.append((sock, 'expired'))
+                    else:
+                        kept.append((sock, connected_at))
+                self.idle = kept
+                missing = self.size - len(self.idle)
+            for sock, reason in dropped:
+                self._discard(sock, reason)
+
+            for _ in range(missing):
+                try:
+                    sock = self._connect()
+                except OSError as e:
+                    with self.lock:
+                        self.connect_errors += 1
+                    print(f"Pool failed to connect to {self.remote_host}:{self.remote_port}: {e}")
+                    break
+                with self.lock:
+                    self.idle.append((sock, time.monotonic()))
+
+            # Sleep until a client drains the pool or the oldest socket needs checking
+            self.wakeup.wait(timeout=min(1.0, self.ttl / 2))
+            self.wakeup.clear()
+
+class Backend:
+    """One upstream server plus its optional warm pool and live tunnel count."""
 
-def handle_client(client_socket, remote_host, remote_port):
+    def __init__(self, host, port, pool=None):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.healthy = True
+        self.active = 0
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+class Balancer:
+    """Picks a backend for each client and tracks open tunnels per backend.
+
+    Strategies: round-robin, least-conn (fewest open tunnels) and ip-hash
+    (consistent hash ring keyed by client IP, so a client keeps hitting the
+    same worker while the backend set is stable). Unhealthy backends are
+    skipped for new clients; tunnels already open to them are left alone.
+    A failed connect only takes a backend out of rotation while the health
+    prober is running, since the prober is what brings it back.
+    """
+
+    VIRTUAL_NODES = 100
+
+    def __init__(self, backends, strategy='round-robin'):
+        self.backends = backends
+        self.strategy = strategy
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.probing = False
+        self.ring = sorted(
+            (zlib.crc32(f"{backend}#{i}".encode()), backend)
+            for backend in backends
+            for i in range(self.VIRTUAL_NODES)
+        )
+        self.ring_keys = [key for key, _ in self.ring]
+
+    def __str__(self):
+        if len(self.backends) == 1:
+            return str(self.backends[0])
+        return f"{', '.join(str(b) for b in self.backends)} ({self.strategy})"
+
+    def acquire(self, client_ip):
+        """Return a backend for this client with its tunnel count incremented."""
+        with self.lock:
+            backend = self._choose(client_ip)
+            backend.active += 1
+            return backend
+
+    def release(self, backend):
+        with self.lock:
+            backend.active -= 1
+
+    def active_tunnels(self):
+        with self.lock:
+            return sum(b.active for b in self.backends)
+
+    def mark_unhealthy(self, backend):
+        if self.probing and backend.healthy:
+            backend.healthy = False
+            print(f"Backend {backend} marked unhealthy")
+
+    def _choose(self, client_ip):
+        # Fail open: if every backend looks down, keep trying all of them
+        # rather than refusing clients until the next health probe
+        candidates = [b for b in self.backends if b.healthy] or self.backends
+        if self.strategy == 'least-conn':
+            return min(candidates, key=lambda b: b.active)
+        if self.strategy == 'ip-hash':
+            start = bisect.bisect(self.ring_keys, zlib.crc32(client_ip.encode()))
+            for offset in range(len(self.ring)):
+                backend = self.ring[(start + offset) % len(self.ring)][1]
+                if backend in candidates:
+                    return backend
+        backend = candidates[self.next_index % len(candidates)]
+        self.next_index += 1
+        return backend
+
+def probe_backends(balancer, interval, timeout=2.0):
+    """Periodically TCP-connect to every backend and flip its healthy flag."""
+    balancer.probing = True
+    while True:
+        for backend in balancer.backends:
+            try:
+                socket.create_connection((backend.host, backend.port), timeout=timeout).close()
+                ok = True
+            except OSError:
+                ok = False
+            if ok != backend.healthy:
+                backend.healthy = ok
+                print(f"Backend {backend} is {'healthy' if ok else 'unhealthy'}")
+        time.sleep(interval)
+
+def report_pool_stats(balancer, interval):
+    while True:
+        time.sleep(interval)
+        for backend in balancer.backends:
+            stats = backend.pool.stats()
+            print(f"Pool {backend}: " + " ".join(f"{k}={v}" for k, v in stats.items()))
+
+def handle_client(client_socket, addr, balancer, metrics, copy_mode, buffer_size):
+    backend = balancer.acquire(addr[0])
+
+    try:
+        remote_socket = backend.pool.acquire() if backend.pool else None
+        if remote_socket is not None:
+            print(f"Using pooled connection to {backend}")
+        else:
+            remote_socket = connect_remote(client_socket, backend, balancer, metrics)
+            if remote_socket is None:
+                return
+
+        # Run one direction on this thread so the backend's tunnel count
+        # drops exactly when both directions are done
+        tunnel = metrics.open_tunnel(f"{addr[0]}:{addr[1]}", backend)
+        upstream = threading.Thread(target=forward, args=(client_socket, remote_socket, "client->remote", copy_mode, buffer_size, tunnel.up, metrics), daemon=True)
+        upstream.start()
+        forward(remote_socket, client_socket, "remote->client", copy_mode, buffer_size, tunnel.down, metrics)
+        upstream.join()
+        client_socket.close()
+        remote_socket.close()
+        metrics.close_tunnel(tunnel)
+    finally:
+        balancer.release(backend)
+
+def connect_remote(client_socket, backend, balancer, metrics):
     try:
-        print(f"Connecting to remote {remote_host}:{remote_port}...")
+        print(f"Connecting to remote {backend}...")
         remote_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         remote_socket.settimeout(5.0)
-        remote_socket.connect((remote_host, remote_port))
+        started = time.perf_counter()
+        remote_socket.connect((backend.host, backend.port))
+        metrics.observe_connect(backend, time.perf_counter() - started)
         remote_socket.settimeout(None) # Remove timeout for data transfer
-        print(f"Connected to remote {remote_host}:{remote_port}")
+        print(f"Connected to remote {backend}")
     except Exception as e:
-        print(f"Failed to connect to remote {remote_host}:{remote_port}: {e}")
+        metrics.error('connect')
+        print(f"Failed to connect to remote {backend}: {e}")
+        balancer.mark_unhealthy(backend)
         client_socket.close()
-        return
+        return None
+    return remote_socket
 
-    def forward(source, destination, name):
+def make_listener(local_port, backlog, reuse_port=False):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name != 'nt':
+        # Lets a restarted relay rebind while old tunnels sit in TIME_WAIT;
+        # on Windows the same option would allow port hijacking
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind(('0.0.0.0', local_port))
+    server.listen(backlog)
+    return server
+
+def wait_for_drain(balancer, drain_timeout):
+    deadline = time.monotonic() + drain_timeout
+    while balancer.active_tunnels() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    remaining = balancer.active_tunnels()
+    if remaining:
+        print(f"Drain timeout: closing {remaining} open tunnel(s)")
+    else:
+        print("All tunnels drained")
+
+def run_threaded(server, balancer, metrics, copy_mode, buffer_size, drain_timeout):
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            print(f"Received signal {signum}: no longer accepting, draining {balancer.active_tunnels()} tunnel(s)")
+            server.close()  # Wakes accept() below with an OSError
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Listening on 0.0.0.0:{server.getsockname()[1]} and forwarding to {balancer} (threaded, {copy_mode})")
+
+    while not stopping.is_set():
         try:
-            while True:
-                data = source.recv(4096)
-                if len(data) == 0:
-                    print(f"Connection {name} closed by source")
-                    break
-                print(f"Forwarding {len(data)} bytes via {name}")
-                destination.send(data)
+            client, addr = server.accept()
+        except OSError:
+            if stopping.is_set():
+                break
+            raise
+        print(f"Accepted connection from {addr}")
+        threading.Thread(target=handle_client, args=(client, addr, balancer, metrics, copy_mode, buffer_size), daemon=True).start()
+
+    wait_for_drain(balancer, drain_timeout)
+
+async def pipe(reader, writer, name, buffer_size, stats, metrics):
+    """Copy one direction until EOF, then half-close the peer's write side."""
+    try:
+        while True:
+            data = await reader.read(buffer_size)
+            if not data:
+                break
+            stats.bytes += len(data)
+            log_chunk(stats, name, len(data))
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError) as e:
+        metrics.error('forward')
+        print(f"Forwarding error in {name}: {e}")
+        writer.close()
+
+async def handle_client_async(client_reader, client_writer, balancer, metrics, buffer_size):
+    addr = client_writer.get_extra_info('peername')
+    backend = balancer.acquire(addr[0])
+
+    try:
+        pooled = backend.pool.acquire() if backend.pool else None
+        try:
+            if pooled is not None:
+                remote_reader, remote_writer = await asyncio.open_connection(sock=pooled)
+            else:
+                started = time.perf_counter()
+                remote_reader, remote_writer = await asyncio.wait_for(
+                    asyncio.open_connection(backend.host, backend.port), timeout=5.0)
+                metrics.observe_connect(backend, time.perf_counter() - started)
         except Exception as e:
-            print(f"Forwarding error in {name}: {e}")
-        finally:
-            source.close()
-            destination.close()
+            metrics.error('connect')
+            print(f"Failed to connect to remote {backend} for {addr}: {e}")
+            balancer.mark_unhealthy(backend)
+            client_writer.close()
+            return
+
+        # Each direction runs until its source hits EOF; the tunnel is torn
+        # down only once both sides have finished, so half-closed streams
+        # (e.g. a client that shuts down writing after its request) still
+        # receive the full response.
+        tunnel = metrics.open_tunnel(f"{addr[0]}:{addr[1]}", backend)
+        await asyncio.gather(
+            pipe(client_reader, remote_writer, "client->remote", buffer_size, tunnel.up, metrics),
+            pipe(remote_reader, client_writer, "remote->client", buffer_size, tunnel.down, metrics),
+        )
+        for writer in (remote_writer, client_writer):
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        metrics.close_tunnel(tunnel)
+    finally:
+        balancer.release(backend)
 
-    threading.Thread(target=forward, args=(client_socket, remote_socket, "client->remote")).start()
-    threading.Thread(target=forward, args=(remote_socket, client_socket, "remote->client")).start()
+async def serve_async(listener, balancer, metrics, buffer_size, drain_timeout):
+    server = await asyncio.start_server(
+        lambda r, w: handle_client_async(r, w, balancer, metrics, buffer_size),
+        sock=listener)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stopping.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still stops the relay, just without draining
+
+    print(f"Listening on 0.0.0.0:{listener.getsockname()[1]} and forwarding to {balancer} (asyncio)")
+
+    await stopping.wait()
+    server.close()
+    print(f"No longer accepting, draining {balancer.active_tunnels()} tunnel(s)")
+    deadline = loop.time() + drain_timeout
+    while balancer.active_tunnels() and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    remaining = balancer.active_tunnels()
+    if remaining:
+        print(f"Drain timeout: closing {remaining} open tunnel(s)")
+    else:
+        print("All tunnels drained")
+
+def run_async(listener, balancer, metrics, buffer_size, drain_timeout):
+    try:
+        asyncio.run(serve_async(listener, balancer, metrics, buffer_size, drain_timeout))
+    except KeyboardInterrupt:
+        pass
+
+def parse_backend(value):
+    host, sep, port = value.rpartition(':')
+    if not sep or not host or not port.isdigit():
+        raise argparse.ArgumentTypeError(f"expected host:port, got {value!r}")
+    return host, int(port)
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: python forward.py <local_port> <remote_host> <remote_port>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='TCP port forwarder for the Rider dev API')
+    parser.add_argument('local_port', type=int)
+    parser.add_argument('remote_host')
+    parser.add_argument('remote_port', type=int)
+    parser.add_argument('--backend', type=parse_backend, action='append', default=[], metavar='HOST:PORT',
+                        help='Additional upstream to balance across (repeatable)')
+    parser.add_argument('--balance', choices=['round-robin', 'least-conn', 'ip-hash'], default='round-robin',
+                        help='Backend selection strategy (default: round-robin)')
+    parser.add_argument('--health-interval', type=float, default=5.0,
+                        help='Seconds between backend TCP health probes, 0 to disable (default: 5)')
+    parser.add_argument('--mode', choices=['asyncio', 'threaded'], default='asyncio',
+                        help='Relay engine: single event loop (default) or one thread per direction')
+    parser.add_argument('--copy-mode', choices=COPY_MODES, default=default_copy_mode(),
+                        help='Threaded data path: splice (Linux zero-copy), recv_into (reused buffer) or copy (legacy)')
+    parser.add_argument('--buffer-size', type=int, default=BUFFER_SIZE,
+                        help=f'Bytes moved per read/splice call (default: {BUFFER_SIZE})')
+    parser.add_argument('--pool-size', type=int, default=0,
+                        help='Pre-connected sockets to keep warm per backend (default: 0, disabled)')
+    parser.add_argument('--pool-ttl', type=float, default=30.0,
+                        help='Seconds an idle pooled socket is kept before being replaced (default: 30)')
+    parser.add_argument('--pool-stats-interval', type=float, default=60.0,
+                        help='Seconds between pool hit/miss reports, 0 to disable (default: 60)')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='Serve Prometheus metrics on 127.0.0.1:PORT/metrics (default: 0, disabled)')
+    parser.add_argument('--log-chunks', type=int, default=0, metavar='N',
+                        help='Debug: log every Nth forwarded chunk per direction (default: 0, off)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Relay processes sharing the port via SO_REUSEPORT (default: 1); '
+                             'worker i serves metrics on --metrics-port + i')
+    parser.add_argument('--backlog', type=int, default=128,
+                        help='Listen backlog per process (default: 128)')
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help='Seconds to let open tunnels finish after SIGTERM (default: 30)')
+    args = parser.parse_args()
 
-    local_port = int(sys.argv[1])
-    remote_host = sys.argv[2]
-    remote_port = int(sys.argv[3])
+    global LOG_CHUNKS_EVERY
+    LOG_CHUNKS_EVERY = args.log_chunks
 
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind(('0.0.0.0', local_port))
-    server.listen(5)
+    if args.copy_mode == 'splice' and not SPLICE_AVAILABLE:
+        parser.error("--copy-mode splice requires Linux and Python 3.10+")
 
-    print(f"Listening on 0.0.0.0:{local_port} and forwarding to {remote_host}:{remote_port}")
+    if args.workers > 1:
+        if not hasattr(socket, 'SO_REUSEPORT') or not hasattr(os, 'fork'):
+            parser.error("--workers requires SO_REUSEPORT and fork (Linux/macOS)")
+        run_workers(args)
+    else:
+        run_worker(args)
 
-    while True:
-        client, addr = server.accept()
-        print(f"Accepted connection from {addr}")
-        threading.Thread(target=handle_client, args=(client, remote_host, remote_port)).start()
+def run_worker(args, worker_id=None):
+    """Build this process's backends, pools and metrics, then relay until stopped."""
+    listener = make_listener(args.local_port, args.backlog, reuse_port=worker_id is not None)
+
+    backends = []
+    for host, port in [(args.remote_host, args.remote_port)] + args.backend:
+        pool = None
+        if args.pool_size > 0:
+            pool = UpstreamPool(host, port, args.pool_size, args.pool_ttl)
+            pool.start()
+            print(f"Keeping {args.pool_size} warm connection(s) to {host}:{port}")
+        backends.append(Backend(host, port, pool))
+    balancer = Balancer(backends, args.balance)
+    metrics = Metrics(balancer)
+    if args.metrics_port:
+        serve_metrics(metrics, args.metrics_port + (worker_id or 0))
+
+    if args.pool_size > 0 and args.pool_stats_interval > 0:
+        threading.Thread(target=report_pool_stats, args=(balancer, args.pool_stats_interval), daemon=True).start()
+    if len(backends) > 1 and args.health_interval > 0:
+        threading.Thread(target=probe_backends, args=(balancer, args.health_interval), daemon=True).start()
+
+    if args.mode == 'threaded':
+        run_threaded(listener, balancer, metrics, args.copy_mode, args.buffer_size, args.drain_timeout)
+    else:
+        run_async(listener, balancer, metrics, args.buffer_size, args.drain_timeout)
+
+def run_workers(args):
+    """Fork one relay per worker; each binds the port itself with SO_REUSEPORT
+    so the kernel spreads incoming connections across them."""
+    children = []
+    for worker_id in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                print(f"Worker {worker_id} started (pid {os.getpid()})")
+                run_worker(args, worker_id)
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+        children.append(pid)
+
+    def stop(signum, frame):
+        print(f"Received signal {signum}: stopping {len(children)} worker(s)")
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    print("All workers exited")
 
 if __name__ == '__main__':
     main()
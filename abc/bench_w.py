@@ -0,0 +1,65 @@
+"""
+Benchmark the stability metrics in w.py on synthetic ROI data.
+
+Compares the original row-wise DataFrame.apply path with the vectorized
+drop_metrics() on 1k / 100k / 1M tickers and checks both give the same
+numbers. The apply path is skipped above --legacy-max-rows because it
+takes minutes at 1M rows.
+
+Usage: python bench_w.py [--rows 1000 100000 1000000] [--quarters 80]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from w import drop_metrics, max_drop, sum_of_drops
+
+
+def make_roi_frame(rows, quarters, seed=0):
+    rng = np.random.default_rng(seed)
+    data = np.round(rng.normal(2.0, 12.0, size=(rows, quarters)), 1)
+    df = pd.DataFrame(data, columns=[f"Q{i + 1}" for i in range(quarters)])
+    df.insert(0, "Ticker", [f"T{i:07d}" for i in range(rows)])
+    return df
+
+
+def legacy_metrics(df, quarter_cols):
+    sums = df[quarter_cols].apply(lambda r: sum_of_drops(r.values), axis=1)
+    maxes = df[quarter_cols].apply(lambda r: max_drop(r.values), axis=1)
+    return sums.to_numpy(), maxes.to_numpy()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark w.py stability metrics")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--quarters", type=int, default=80)
+    parser.add_argument("--legacy-max-rows", type=int, default=100_000,
+                        help="Skip the row-wise apply path above this many rows")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'apply (s)':>10}  {'vectorized (s)':>15}  {'speedup':>8}  match")
+    for rows in args.rows:
+        df = make_roi_frame(rows, args.quarters)
+        quarter_cols = [c for c in df.columns if c != "Ticker"]
+
+        vec_time, (vec_sum, vec_max) = timed(lambda: drop_metrics(df[quarter_cols].to_numpy()))
+
+        if rows <= args.legacy_max_rows:
+            legacy_time, (old_sum, old_max) = timed(legacy_metrics, df, quarter_cols)
+            match = np.array_equal(old_sum, vec_sum) and np.array_equal(old_max, vec_max)
+            print(f"{rows:>10}  {legacy_time:>10.3f}  {vec_time:>15.4f}  {legacy_time / vec_time:>7.0f}x  {match}")
+        else:
+            print(f"{rows:>10}  {'skipped':>10}  {vec_time:>15.4f}  {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
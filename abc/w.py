@@ -1,8 +1,29 @@
+import argparse
+import glob
+import hashlib
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
 INPUT_FILE = "roi_input.csv"          # <-- your ROI CSV file
 OUTPUT_FILE = "stability_results.csv" # <-- final output
+CHUNK_ROWS = 100_000                  # <-- rows per chunk in --stream mode
+TOP_K = 20                            # <-- tickers shown per ranking outside the default mode
+BATCH_OUTPUT_DIR = "stability_batch"  # <-- per-file and combined results in --batch mode
+COMBINED_FILE = "combined_rankings.csv"
+CACHE_DIR = ".stability_cache"        # <-- reused results keyed by input content hash
+CACHE_VERSION = 2                     # <-- bump when the metric definitions change
+STATE_FILE = "stability_state.npz"    # <-- running per-ticker state for --incremental
+DEFAULT_METRICS = ["Sum_of_Drops", "Max_Drop"]
+
+# File extensions read/written as columnar formats (needs pyarrow); anything else is CSV
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+FEATHER_EXTENSIONS = (".feather", ".arrow")
 
 
 def sum_of_drops(row):
@@ -17,34 +38,515 @@ def max_drop(row):
     return round(min(negative_vals), 1) if negative_vals else 0.0
 
 
-def main():
-    print("\nLoading ROI data from:", INPUT_FILE)
-    df = pd.read_csv(INPUT_FILE)
+class MetricInputs:
+    """One tickers x quarters block plus the intermediates metric kernels share.
+
+    Each intermediate is computed at most once however many selected
+    metrics use it, so any combination of metrics costs a single pass over
+    the quarter columns.
+    """
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+
+    @cached_property
+    def drops(self):
+        """Negative returns; non-negative and NaN quarters count as 0."""
+        return np.where(self.values < 0, self.values, 0.0)
+
+    @cached_property
+    def quarters_reported(self):
+        return np.count_nonzero(~np.isnan(self.values), axis=1)
+
+    @cached_property
+    def drop_totals(self):
+        # Summed one quarter column at a time so the floating-point addition
+        # order matches sum() in sum_of_drops()
+        total = np.zeros(len(self.drops))
+        for col in self.drops.T:
+            total += col
+        return total
+
+    @cached_property
+    def downside_deviation(self):
+        """Root mean square of drops below a 0% target, over reported quarters."""
+        squares = np.square(self.drops).sum(axis=1)
+        return np.sqrt(np.divide(squares, self.quarters_reported,
+                                 out=np.zeros(len(squares)), where=self.quarters_reported > 0))
+
+
+# name -> (kernel, ranking label, ranking order note, ascending)
+METRICS = {}
+
+
+def register_metric(name, label, order_note, ascending):
+    """Add a vectorized kernel taking MetricInputs and returning one value per ticker."""
+    def register(kernel):
+        METRICS[name] = (kernel, label, order_note, ascending)
+        return kernel
+    return register
+
+
+@register_metric("Sum_of_Drops", "SUM OF DROPS", "most stable first", ascending=True)
+def metric_sum_of_drops(inputs):
+    return np.round(inputs.drop_totals, 1)
+
+
+@register_metric("Max_Drop", "MAX SINGLE DROP", "least severe first", ascending=True)
+def metric_max_drop(inputs):
+    return np.round(inputs.drops.min(axis=1, initial=0.0), 1)
+
+
+@register_metric("Max_Drawdown", "MAX DRAWDOWN", "shallowest first", ascending=False)
+def metric_max_drawdown(inputs):
+    """Worst peak-to-trough fall in percent of returns compounded quarter by quarter."""
+    wealth = np.cumprod(1.0 + np.nan_to_num(inputs.values) / 100.0, axis=1)
+    # Starting capital (1.0) counts as the first peak, so an immediate loss is a drawdown
+    peaks = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=1)
+    return np.round((wealth / peaks - 1.0).min(axis=1, initial=0.0) * 100.0, 1)
+
+
+@register_metric("Downside_Deviation", "DOWNSIDE DEVIATION", "lowest first", ascending=True)
+def metric_downside_deviation(inputs):
+    return np.round(inputs.downside_deviation, 1)
+
+
+@register_metric("Sortino", "SORTINO RATIO", "best first", ascending=False)
+def metric_sortino(inputs):
+    """Mean quarterly return over downside deviation; inf when there were no drops."""
+    mean = np.divide(np.nansum(inputs.values, axis=1), inputs.quarters_reported,
+                     out=np.zeros(len(inputs.values)), where=inputs.quarters_reported > 0)
+    deviation = inputs.downside_deviation
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = mean / deviation
+    return np.round(ratio, 2)
+
 
+def compute_metrics(values, metrics=DEFAULT_METRICS):
+    """Selected metrics for a tickers x quarters array, as {name: values}."""
+    inputs = MetricInputs(values)
+    return {name: METRICS[name][0](inputs) for name in metrics}
+
+
+def drop_metrics(values):
+    """Sum_of_Drops and Max_Drop for every row of a tickers x quarters array.
+
+    Same results as sum_of_drops()/max_drop() applied per row: non-negative
+    and NaN returns count as 0, the drops are summed one quarter column at
+    a time so the floating-point addition order matches sum(), and
+    np.round is what round() does on the numpy floats those rows hold.
+    """
+    results = compute_metrics(values, ["Sum_of_Drops", "Max_Drop"])
+    return results["Sum_of_Drops"], results["Max_Drop"]
+
+
+def file_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in PARQUET_EXTENSIONS:
+        return "parquet"
+    if suffix in FEATHER_EXTENSIONS:
+        return "feather"
+    return "csv"
+
+
+def read_roi(path, quarters=None):
+    """Load an ROI table, reading only Ticker plus `quarters` when given."""
+    columns = ["Ticker"] + list(quarters) if quarters else None
+    fmt = file_format(path)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if fmt == "feather":
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def read_roi_columns(path):
+    """Column names of an ROI file without loading any rows."""
+    fmt = file_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(path).names
+    if fmt == "feather":
+        import pyarrow.ipc
+        with pyarrow.ipc.open_file(path) as reader:
+            return reader.schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def write_results(df, path):
+    fmt = file_format(path)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+def cache_key(path, quarters=None, metrics=DEFAULT_METRICS):
+    """Hash of the input bytes plus everything else that shapes the results."""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}|{quarters or ''}|{','.join(metrics)}|".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_results(input_file, quarters=None, cache_dir=CACHE_DIR, metrics=DEFAULT_METRICS):
+    """Input frame with drop metrics, reused from cache_dir when the input is unchanged.
+
+    A hit skips parsing and computing entirely: the cached frame is stored
+    as a pickle, which loads far faster than re-reading the CSV text.
+    """
+    if not cache_dir:
+        return add_metrics(read_roi(input_file, quarters), metrics), False
+
+    cached = Path(cache_dir) / f"{cache_key(input_file, quarters, metrics)}.pkl"
+    if cached.exists():
+        try:
+            return pd.read_pickle(cached), True
+        except Exception as e:
+            print(f"[WARNING] Ignoring unreadable cache entry {cached}: {e}")
+
+    df = add_metrics(read_roi(input_file, quarters), metrics)
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+    df.to_pickle(tmp)
+    os.replace(tmp, cached)  # Atomic, so parallel batch workers never see a partial entry
+    return df, False
+
+
+def add_metrics(df, metrics=DEFAULT_METRICS):
+    """Append one column per selected metric computed over all quarter columns."""
     # Extract quarter columns (all except Ticker)
     quarter_cols = [c for c in df.columns if c != "Ticker"]
 
     # Calculate metrics
-    df["Sum_of_Drops"] = df[quarter_cols].apply(lambda r: sum_of_drops(r.values), axis=1)
-    df["Max_Drop"] = df[quarter_cols].apply(lambda r: max_drop(r.values), axis=1)
-
-    # Sort by lowest drop (most stable)
-    ranked_sum = df.sort_values(by="Sum_of_Drops", ascending=True)
+    for name, values in compute_metrics(df[quarter_cols].to_numpy(), metrics).items():
+        df[name] = values
+    return df
 
-    # Sort by least severe single drop
-    ranked_max = df.sort_values(by="Max_Drop", ascending=True)
 
-    print("\n=== Ranking by SUM OF DROPS (most stable first) ===\n")
-    print(ranked_sum[["Ticker", "Sum_of_Drops"]].to_string(index=False))
+def rank_full(input_file, output_file, quarters=None, cache_dir=CACHE_DIR, metrics=DEFAULT_METRICS):
+    print("\nLoading ROI data from:", input_file)
+    df, cache_hit = load_results(input_file, quarters, cache_dir, metrics)
+    if cache_hit:
+        print("Input unchanged, reusing cached results")
 
-    print("\n=== Ranking by MAX SINGLE DROP (least severe first) ===\n")
-    print(ranked_max[["Ticker", "Max_Drop"]].to_string(index=False))
+    for name in metrics:
+        _, label, order_note, ascending = METRICS[name]
+        ranked = df.sort_values(by=name, ascending=ascending)
+        print(f"\n=== Ranking by {label} ({order_note}) ===\n")
+        print(ranked[["Ticker", name]].to_string(index=False))
 
     # Save combined results
-    df.to_csv(OUTPUT_FILE, index=False)
-    print("\nSaved combined results to:", OUTPUT_FILE)
+    write_results(df, output_file)
+    print("\nSaved combined results to:", output_file)
+
+
+def push_top_k(heap, values, tickers, row_offset, k):
+    """Keep the k smallest values seen so far in a bounded max-heap.
+
+    Pass negated values to keep the k largest instead.
+
+    Entries are (-value, -row, ticker) so the heap root is the current
+    k-th smallest and ties keep input order, like the full-mode sort.
+    Each chunk is pre-filtered with argpartition so only its own k best
+    rows ever reach Python.
+    """
+    # NaN (e.g. a ticker with no reported quarters) must not win a ranking
+    values = np.where(np.isnan(values), np.inf, values)
+    if len(values) > k:
+        candidates = np.argpartition(values, k - 1)[:k]
+    else:
+        candidates = np.arange(len(values))
+    for i in candidates.tolist():
+        entry = (-float(values[i]), -(row_offset + i), tickers[i])
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+
+def sorted_top_k(heap, column, sign=1):
+    rows = sorted(heap, reverse=True)
+    return pd.DataFrame({"Ticker": [t for _, _, t in rows], column: [-v * sign for v, _, _ in rows]})
+
+
+def rank_streaming(input_file, output_file, chunk_rows=CHUNK_ROWS, top_k=TOP_K, quarters=None,
+                   metrics=DEFAULT_METRICS):
+    """Same metrics as rank_full() without ever holding the whole file.
+
+    Quarter columns are parsed as float32 to halve chunk memory, so a
+    drop sum can differ from full mode in its last rounded digit.
+    """
+    if file_format(input_file) != "csv" or file_format(output_file) != "csv":
+        raise SystemExit("--stream reads and writes CSV only; columnar files can be ranked without it")
+
+    print("\nStreaming ROI data from:", input_file, f"({chunk_rows} rows per chunk)")
+    columns = pd.read_csv(input_file, nrows=0).columns
+    quarter_cols = list(quarters) if quarters else [c for c in columns if c != "Ticker"]
+    dtypes = {c: np.float32 for c in quarter_cols}
+    dtypes["Ticker"] = str
+
+    # Descending rankings keep the k smallest negated values
+    signs = {name: 1 if METRICS[name][3] else -1 for name in metrics}
+    heaps = {name: [] for name in metrics}
+    rows = 0
+    for chunk in pd.read_csv(input_file, usecols=["Ticker"] + quarter_cols, dtype=dtypes, chunksize=chunk_rows):
+        results = compute_metrics(chunk[quarter_cols].to_numpy(), metrics)
+
+        tickers = chunk["Ticker"].tolist()
+        for name, values in results.items():
+            chunk[name] = values
+            push_top_k(heaps[name], values * signs[name], tickers, rows, top_k)
+
+        chunk.to_csv(output_file, index=False, mode="w" if rows == 0 else "a", header=rows == 0)
+        rows += len(chunk)
+
+    for name in metrics:
+        _, label, order_note, _ = METRICS[name]
+        print(f"\n=== Ranking by {label} ({order_note}, top {top_k} of {rows}) ===\n")
+        print(sorted_top_k(heaps[name], name, signs[name]).to_string(index=False))
+
+    print("\nSaved combined results to:", output_file)
+
+
+def find_batch_inputs(pattern):
+    """ROI files matched by a directory or glob, skipping earlier batch results."""
+    if os.path.isdir(pattern):
+        extensions = (".csv",) + PARQUET_EXTENSIONS + FEATHER_EXTENSIONS
+        paths = [p for ext in extensions for p in glob.glob(os.path.join(pattern, f"*{ext}"))]
+    else:
+        paths = glob.glob(pattern)
+    return sorted(p for p in map(Path, paths)
+                  if p.is_file() and "_stability." not in p.name and p.name != COMBINED_FILE)
+
+
+def process_batch_file(input_file, output_dir, output_format="csv", quarters=None, cache_dir=CACHE_DIR,
+                       metrics=DEFAULT_METRICS):
+    """Worker: rank one portfolio file and write its results.
+
+    Runs in its own process with nothing shared; only the three ranking
+    columns travel back to the parent for the combined ranking.
+    """
+    df, _ = load_results(input_file, quarters, cache_dir, metrics)
+    output_file = Path(output_dir) / f"{Path(input_file).stem}_stability.{output_format}"
+    write_results(df, output_file)
+
+    summary = df[["Ticker"] + list(metrics)].copy()
+    summary.insert(0, "Source", Path(input_file).name)
+    return summary
+
+
+def rank_batch(pattern, output_dir=BATCH_OUTPUT_DIR, workers=None, top_k=TOP_K,
+               output_format="csv", quarters=None, cache_dir=CACHE_DIR, metrics=DEFAULT_METRICS):
+    inputs = find_batch_inputs(pattern)
+    if not inputs:
+        print("\nNo ROI CSV files matched:", pattern)
+        return
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count()
+
+    print(f"\nProcessing {len(inputs)} ROI file(s) with {workers} worker(s)")
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_batch_file, str(path), output_dir, output_format, quarters, cache_dir, metrics): path
+                   for path in inputs}
+        for future, path in futures.items():
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                print(f"  FAILED: {path}: {e}")
+            else:
+                print("  done:", path)
+
+    if not summaries:
+        return
+    combined = pd.concat(summaries, ignore_index=True)
+
+    for name in metrics:
+        _, label, order_note, ascending = METRICS[name]
+        ranked = combined.sort_values(by=name, ascending=ascending)
+        print(f"\n=== Combined ranking by {label} ({order_note}, top {top_k} of {len(combined)}) ===\n")
+        print(ranked[["Source", "Ticker", name]].head(top_k).to_string(index=False))
+
+    first = metrics[0]
+    combined_file = Path(output_dir) / COMBINED_FILE
+    combined.sort_values(by=first, ascending=METRICS[first][3]).to_csv(combined_file, index=False)
+    print("\nSaved per-file results and combined ranking to:", output_dir)
+
+
+def new_state(window=0):
+    """Empty running state: one row per ticker, plus a ring of recent drops."""
+    return {
+        "tickers": np.array([], dtype=str),
+        "quarters": np.array([], dtype=str),
+        "drop_sum": np.zeros(0),
+        "worst_drop": np.zeros(0),
+        "drop_count": np.zeros(0, dtype=np.int32),
+        "window": np.array(window),
+        "recent": np.zeros((0, window)),
+        "recent_pos": np.array(0),
+    }
+
+
+def load_state(path, window=0):
+    if not os.path.exists(path):
+        return new_state(window)
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+    if int(state["window"]) != window:
+        raise SystemExit(f"{path} tracks a {int(state['window'])}-quarter window; "
+                         f"rerun with --window {int(state['window'])} or --rebuild")
+    return state
+
+
+def save_state(state, path):
+    # np.savez appends .npz to names without it, so write through a file handle
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **state)
+    os.replace(tmp, path)
+
+
+def update_state(state, tickers, values, quarter_cols):
+    """Fold new quarter columns into the running state in O(tickers) per quarter.
+
+    Quarters are applied in order, so drop_sum accumulates in exactly the
+    order drop_metrics() uses and rounds to the same Sum_of_Drops. Tickers
+    absent from this file get a 0 drop for the new quarters, as NaN would.
+    """
+    known = pd.Index(state["tickers"])
+    rows = known.get_indexer(tickers)
+    added = [t for t, r in zip(tickers, rows) if r < 0]
+    if added:
+        n = len(added)
+        state["tickers"] = np.concatenate([state["tickers"], np.array(added, dtype=str)])
+        state["drop_sum"] = np.concatenate([state["drop_sum"], np.zeros(n)])
+        state["worst_drop"] = np.concatenate([state["worst_drop"], np.zeros(n)])
+        state["drop_count"] = np.concatenate([state["drop_count"], np.zeros(n, dtype=np.int32)])
+        state["recent"] = np.vstack([state["recent"], np.zeros((n, state["recent"].shape[1]))])
+        rows = pd.Index(state["tickers"]).get_indexer(tickers)
+
+    values = np.asarray(values, dtype=np.float64)
+    drops = np.zeros((len(state["tickers"]), len(quarter_cols)))
+    drops[rows] = np.where(values < 0, values, 0.0)
+
+    window = int(state["window"])
+    pos = int(state["recent_pos"])
+    for j in range(len(quarter_cols)):
+        col = drops[:, j]
+        state["drop_sum"] += col
+        np.minimum(state["worst_drop"], col, out=state["worst_drop"])
+        state["drop_count"] += col < 0
+        if window:
+            state["recent"][:, pos] = col
+            pos = (pos + 1) % window
+    state["recent_pos"] = np.array(pos)
+    state["quarters"] = np.concatenate([state["quarters"], np.array(quarter_cols, dtype=str)])
+
+
+def state_results(state):
+    """Rankable metrics derived from the running state."""
+    results = pd.DataFrame({
+        "Ticker": state["tickers"],
+        "Sum_of_Drops": np.round(state["drop_sum"], 1),
+        "Max_Drop": np.round(state["worst_drop"], 1),
+        "Drop_Count": state["drop_count"],
+    })
+    window = int(state["window"])
+    if window:
+        recent = state["recent"]
+        results[f"Sum_of_Drops_{window}Q"] = np.round(recent.sum(axis=1), 1)
+        results[f"Max_Drop_{window}Q"] = np.round(recent.min(axis=1) if len(recent) else recent.sum(axis=1), 1)
+    return results
+
+
+def rank_incremental(input_file, output_file, state_file=STATE_FILE, window=0, top_k=TOP_K, rebuild=False):
+    """Update the running state with quarters not seen before, then re-rank.
+
+    Only Ticker and the new quarter columns are read, so a nightly run
+    after one quarter is appended costs O(tickers) instead of
+    O(tickers x quarters).
+    """
+    state = new_state(window) if rebuild else load_state(state_file, window)
+    columns = [c for c in read_roi_columns(input_file) if c != "Ticker"]
+    seen = set(state["quarters"].tolist())
+    new_cols = [c for c in columns if c not in seen]
+    missing = seen - set(columns)
+    if missing:
+        print(f"[WARNING] {len(missing)} quarter(s) already in the state are missing from the input")
+
+    print(f"\nIncremental update from: {input_file} ({len(new_cols)} new of {len(columns)} quarter(s))")
+    if new_cols:
+        df = read_roi(input_file, new_cols)
+        update_state(state, df["Ticker"].astype(str).tolist(), df[new_cols].to_numpy(), new_cols)
+        save_state(state, state_file)
+        print("Saved running state to:", state_file)
+
+    results = state_results(state)
+    rankings = [("Sum_of_Drops", "SUM OF DROPS (most stable first)"),
+                ("Max_Drop", "MAX SINGLE DROP (least severe first)")]
+    if window:
+        rankings += [(f"Sum_of_Drops_{window}Q", f"SUM OF DROPS, LAST {window} QUARTERS"),
+                     (f"Max_Drop_{window}Q", f"MAX SINGLE DROP, LAST {window} QUARTERS")]
+    for column, title in rankings:
+        ranked = results.sort_values(by=column, ascending=True)
+        print(f"\n=== Ranking by {title}, top {top_k} of {len(results)} ===\n")
+        print(ranked[["Ticker", column]].head(top_k).to_string(index=False))
+
+    write_results(results, output_file)
+    print("\nSaved combined results to:", output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank tickers by quarterly ROI stability")
+    parser.add_argument("-i", "--input", default=INPUT_FILE,
+                        help=f"ROI file: .csv, .parquet or .feather (default: {INPUT_FILE})")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE,
+                        help=f"Results file, format chosen by extension (default: {OUTPUT_FILE})")
+    parser.add_argument("--quarters", nargs="+", metavar="COLUMN",
+                        help="Only read and rank these quarter columns (default: all)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"Reuse results for unchanged inputs from here (default: {CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Always recompute")
+    parser.add_argument("--metrics", nargs="+", choices=list(METRICS), default=DEFAULT_METRICS, metavar="METRIC",
+                        help=f"Metrics to compute and rank, in one pass: {', '.join(METRICS)} "
+                             f"(default: {' '.join(DEFAULT_METRICS)}; --incremental always uses the default)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process the input in chunks for files that do not fit in memory")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"Rows per chunk in --stream mode (default: {CHUNK_ROWS})")
+    parser.add_argument("--top", type=int, default=TOP_K,
+                        help=f"Tickers shown per ranking in --stream/--batch/--incremental mode (default: {TOP_K})")
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB",
+                        help="Rank every ROI CSV in a directory or glob in parallel")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR,
+                        help=f"Where --batch writes per-file and combined results (default: {BATCH_OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for --batch (default: CPU count)")
+    parser.add_argument("--output-format", choices=["csv", "parquet", "feather"], default="csv",
+                        help="Per-file result format in --batch mode (default: csv)")
+    parser.add_argument("--incremental", nargs="?", const=STATE_FILE, metavar="STATE_FILE",
+                        help=f"Only process quarters not yet in the running state file (default: {STATE_FILE})")
+    parser.add_argument("--window", type=int, default=0,
+                        help="With --incremental, also rank drops over the last N quarters")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="With --incremental, discard the state and rebuild it from every quarter")
+    args = parser.parse_args()
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.incremental:
+        rank_incremental(args.input, args.output, args.incremental, args.window, args.top, args.rebuild)
+    elif args.batch:
+        rank_batch(args.batch, args.output_dir, args.workers, args.top,
+                   args.output_format, args.quarters, cache_dir, args.metrics)
+    elif args.stream:
+        rank_streaming(args.input, args.output, args.chunk_rows, args.top, args.quarters, args.metrics)
+    else:
+        rank_full(args.input, args.output, args.quarters, cache_dir, args.metrics)
 
 
 if __name__ == "__main__":
     main()
-
@@ -7,8 +7,17 @@ Uses ADB commands, uiautomator for UI element detection, and parallel execution
 import subprocess
 import time
 import os
+import sys
+import csv
+import json
+import argparse
+import math
 import xml.etree.ElementTree as ET
 import re
+import io
+import itertools
+import queue
+import threading
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
@@ -40,27 +49,199 @@ COORDS2 = {
     'dest_lng': '31.2095'
 }
 
+APP_PACKAGE = "com.ovoride.rider"  # Adjust as needed
+
 SCREENSHOT_DIR = Path('emulator_test_screenshots')
 SCREENSHOT_DIR.mkdir(exist_ok=True)
 
-STEP_DELAY = 3  # seconds
+UI_TIMEOUT = 15  # seconds to wait for a screen or element before giving up
+POLL_INTERVAL = 0.1  # first delay between UI polls
+POLL_MAX = 1.0  # polls back off up to this delay
+COMMAND_TIMEOUT = 30  # seconds
+# Shell commands after which the cached UI snapshot is stale
+SCREEN_CHANGING_COMMANDS = ('shell input ', 'shell am ', 'shell monkey ')
+
+
+class AdbShell:
+    """Persistent `adb shell` session for one device
+    
+    Commands are written to the shell's stdin, each followed by an echo of a
+    unique marker, so the caller knows exactly when a command has finished
+    instead of sleeping. Commands sent with send() are pipelined - the next
+    run() or sync() waits for all of them.
+    """
+    MARKER = "__adb_shell_done__"
+    
+    def __init__(self, serial):
+        self.serial = serial
+        self.process = None
+        self.stdin = None
+        self.lines = None
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+    
+    def start(self):
+        self.process = subprocess.Popen(
+            ['adb', '-s', self.serial, 'shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        # Text mode would write "\r\n" on Windows and the device's sh would
+        # see a stray "\r" on every command, so always send plain "\n"
+        self.stdin = io.TextIOWrapper(self.process.stdin, encoding='utf-8', newline='\n', write_through=True)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process, self.lines), daemon=True).start()
+    
+    @staticmethod
+    def _read(process, lines):
+        for line in io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace'):
+            lines.put(line)
+        lines.put(None)
+    
+    def send(self, command):
+        """Queue a command without waiting for it; returns its marker id"""
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            command_id = next(self.ids)
+            self.stdin.write(f"{command}\necho {self.MARKER}{command_id}\n")
+            self.stdin.flush()
+            return command_id
+    
+    def wait(self, command_id, timeout=COMMAND_TIMEOUT):
+        """Wait until command_id has finished; returns its output"""
+        with self.lock:
+            deadline = time.monotonic() + timeout
+            output = []
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    line = None
+                if line is None:
+                    # Timed out or the session died - its state is unknown, start over
+                    self.close()
+                    return None
+                # Output without a trailing newline runs straight into the marker
+                head, found, tail = line.partition(self.MARKER)
+                output.append(head)
+                if found:
+                    if int(tail) >= command_id:
+                        return "".join(output).strip()
+                    output = []  # output of an earlier pipelined command
+    
+    def run(self, command, timeout=COMMAND_TIMEOUT):
+        """Run a command and wait for it to finish; returns its output"""
+        return self.wait(self.send(command), timeout)
+    
+    def sync(self, timeout=COMMAND_TIMEOUT):
+        """Wait for every command sent so far"""
+        return self.run("true", timeout)
+    
+    def close(self):
+        if self.process is not None:
+            try:
+                self.stdin.close()
+            except OSError:
+                pass
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+
+BOUNDS_RE = re.compile(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]')
+
+
+class UISnapshot:
+    """One UI hierarchy dump, indexed for repeated element lookups
+    
+    Only nodes with valid bounds are kept (nothing else can be tapped), with
+    their centers worked out up front. Exact text lookups are dict hits;
+    substring text and resource-id lookups scan the precomputed strings in
+    document order once and are memoized, so a chain of lookups costs one
+    dump and no further XML parsing, and returns the same first match as a
+    fresh parse would.
+    """
+    
+    def __init__(self, xml_content):
+        # (text, lowercase text, resource-id, element) in document order
+        self.nodes = []
+        self.by_text = {}
+        self.memo = {}
+        
+        root = ET.fromstring(xml_content)
+        for node in root.iter():
+            match = BOUNDS_RE.match(node.attrib.get('bounds', ''))
+            if not match:
+                continue
+            x1, y1, x2, y2 = map(int, match.groups())
+            text = node.attrib.get('text')
+            resource_id = node.attrib.get('resource-id')
+            element = {'x': (x1 + x2) // 2, 'y': (y1 + y2) // 2, 'bounds': node.attrib['bounds']}
+            self.nodes.append((text, text.lower() if text is not None else None, resource_id, element))
+            if text is not None:
+                self.by_text.setdefault(text, {**element, 'text': text})
+    
+    def find_by_text(self, text, exact=False):
+        if exact:
+            return self.by_text.get(text)
+        key = ('text', text.lower())
+        if key not in self.memo:
+            self.memo[key] = next(({**element, 'text': node_text}
+                                   for node_text, lower, _, element in self.nodes
+                                   if lower is not None and key[1] in lower), None)
+        return self.memo[key]
+    
+    def find_by_id(self, resource_id):
+        key = ('id', resource_id)
+        if key not in self.memo:
+            # Partial ids like 'email' for 'com.app:id/email'
+            self.memo[key] = next((element for _, _, node_id, element in self.nodes
+                                   if node_id and resource_id in node_id), None)
+        return self.memo[key]
+
 
 class EmulatorController:
     def __init__(self, serial):
         self.serial = serial
+        # None until the first dump shows whether exec-out to /dev/tty works here
+        self.tty_dump = None
+        self.shell = AdbShell(serial)
+        # Current UI hierarchy; dropped whenever a command may change the screen
+        self.snapshot = None
         
     def run_adb(self, command, wait=True):
-        """Run ADB command"""
+        """Run ADB command
+        
+        Shell commands go through the device's persistent shell session and,
+        with wait=True, return once the command has finished on the device.
+        With wait=False they are queued behind any earlier commands.
+        """
+        if command.startswith('shell '):
+            if command.startswith(SCREEN_CHANGING_COMMANDS):
+                self.invalidate()
+            if not wait:
+                self.shell.send(command[len('shell '):])
+                return ""
+            output = self.shell.run(command[len('shell '):])
+            if output is None:
+                print(f"[ERROR] ADB command timeout: adb -s {self.serial} {command}")
+                return ""
+            return output
+        
         cmd = ['adb', '-s', self.serial] + command.split()
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            if wait:
-                time.sleep(0.5)
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT)
             return result.stdout.strip()
         except subprocess.TimeoutExpired:
             print(f"[ERROR] ADB command timeout: {' '.join(cmd)}")
             return ""
     
+    def close(self):
+        """End the persistent shell session"""
+        self.shell.close()
+    
     def take_screenshot(self, filename):
         """Take screenshot from emulator"""
         path = SCREENSHOT_DIR / f"{self.serial}_{filename}.png"
@@ -78,6 +259,35 @@ class EmulatorController:
     
     def get_ui_xml(self):
         """Get UI hierarchy XML using uiautomator"""
+        if self.tty_dump is not False:
+            content = self.get_ui_xml_tty()
+            if self.tty_dump is None:
+                self.tty_dump = content is not None
+            if content is not None:
+                return content
+        return self.get_ui_xml_pull()
+    
+    def get_ui_xml_tty(self):
+        """Dump UI hierarchy straight to stdout - one adb call, no file on the device"""
+        try:
+            result = subprocess.run(
+                ['adb', '-s', self.serial, 'exec-out', 'uiautomator', 'dump', '/dev/tty'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=30
+            )
+        except subprocess.TimeoutExpired:
+            print(f"[ERROR] ADB command timeout: exec-out uiautomator dump on {self.serial}")
+            return None
+        
+        # uiautomator appends "UI hierchary dumped to: /dev/tty" after the XML
+        end = result.stdout.rfind(b'</hierarchy>')
+        if result.returncode != 0 or end < 0:
+            return None
+        return result.stdout[:end + len(b'</hierarchy>')].decode('utf-8')
+    
+    def get_ui_xml_pull(self):
+        """Get UI hierarchy XML via a file on the device (older uiautomator)"""
         xml_path = f"/sdcard/ui_dump_{int(time.time())}.xml"
         self.run_adb(f"shell uiautomator dump {xml_path}")
         local_xml = f"ui_dump_{self.serial}.xml"
@@ -90,58 +300,89 @@ class EmulatorController:
             return content
         return None
     
-    def find_element_by_text(self, text, exact=False):
-        """Find UI element by text in XML"""
-        xml_content = self.get_ui_xml()
-        if not xml_content:
-            return None
+    def get_snapshot(self):
+        """Current UI snapshot - dumps only if nothing changed the screen since the last one"""
+        if self.snapshot is None:
+            xml_content = self.get_ui_xml()
+            if not xml_content:
+                return None
+            try:
+                self.snapshot = UISnapshot(xml_content)
+            except Exception as e:
+                print(f"[ERROR] XML parsing error: {e}")
+                return None
+        return self.snapshot
+    
+    def invalidate(self):
+        """Force the next lookup to dump the UI again (e.g. after the app changed on its own)"""
+        self.snapshot = None
+    
+    def find_first(self, candidates, exact=False):
+        """First element matching ('id' | 'text', value) candidates, tried in the given order"""
+        for kind, value in candidates:
+            element = self.find_element_by_id(value) if kind == 'id' else self.find_element_by_text(value, exact)
+            if element:
+                return element
+        return None
+    
+    def wait_for_element(self, candidates, timeout=UI_TIMEOUT, poll=POLL_INTERVAL, exact=False):
+        """Wait until an element matching any of the candidates appears
         
-        try:
-            # Parse XML
-            root = ET.fromstring(xml_content)
-            for node in root.iter():
-                if 'text' in node.attrib:
-                    node_text = node.attrib['text']
-                    if (exact and node_text == text) or (not exact and text.lower() in node_text.lower()):
-                        bounds = node.attrib.get('bounds', '')
-                        # Extract coordinates from bounds="[x1,y1][x2,y2]"
-                        match = re.match(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', bounds)
-                        if match:
-                            x1, y1, x2, y2 = map(int, match.groups())
-                            center_x = (x1 + x2) // 2
-                            center_y = (y1 + y2) // 2
-                            return {'x': center_x, 'y': center_y, 'bounds': bounds, 'text': node_text}
-        except Exception as e:
-            print(f"[ERROR] XML parsing error: {e}")
+        candidates is a list of ('id', resource_id) and ('text', text) pairs,
+        tried in order against each dump. Returns the first match as soon as
+        there is one, or None once timeout has passed. The delay between
+        dumps starts at poll and backs off up to POLL_MAX.
+        """
+        deadline = time.monotonic() + timeout
+        delay = poll
+        while True:
+            element = self.find_first(candidates, exact)
+            remaining = deadline - time.monotonic()
+            if element or remaining <= 0:
+                return element
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX)
+            self.invalidate()
+    
+    def wait_for_idle(self, timeout=UI_TIMEOUT, poll=POLL_INTERVAL):
+        """Wait until two dumps in a row show the same UI hierarchy
         
-        return None
+        Returns True once the screen has settled, False on timeout. The
+        settled dump becomes the current snapshot, so lookups right after
+        this don't dump again.
+        """
+        deadline = time.monotonic() + timeout
+        delay = poll
+        previous = None
+        while True:
+            xml_content = self.get_ui_xml()
+            if xml_content is not None and xml_content == previous:
+                try:
+                    self.snapshot = UISnapshot(xml_content)
+                except Exception as e:
+                    print(f"[ERROR] XML parsing error: {e}")
+                return True
+            previous = xml_content
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"[WARNING] {self.serial}: UI still changing after {timeout}s")
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX)
+    
+    def find_element_by_text(self, text, exact=False):
+        """Find UI element by text in XML"""
+        snapshot = self.get_snapshot()
+        return snapshot.find_by_text(text, exact) if snapshot else None
     
     def find_element_by_id(self, resource_id):
         """Find UI element by resource ID"""
-        xml_content = self.get_ui_xml()
-        if not xml_content:
-            return None
-        
-        try:
-            root = ET.fromstring(xml_content)
-            for node in root.iter():
-                if 'resource-id' in node.attrib and resource_id in node.attrib['resource-id']:
-                    bounds = node.attrib.get('bounds', '')
-                    match = re.match(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', bounds)
-                    if match:
-                        x1, y1, x2, y2 = map(int, match.groups())
-                        center_x = (x1 + x2) // 2
-                        center_y = (y1 + y2) // 2
-                        return {'x': center_x, 'y': center_y, 'bounds': bounds}
-        except Exception as e:
-            print(f"[ERROR] XML parsing error: {e}")
-        
-        return None
+        snapshot = self.get_snapshot()
+        return snapshot.find_by_id(resource_id) if snapshot else None
     
     def tap(self, x, y):
         """Tap at coordinates"""
         self.run_adb(f"shell input tap {x} {y}")
-        time.sleep(0.5)
     
     def tap_element(self, element):
         """Tap element found by find_element_*"""
@@ -152,23 +393,20 @@ class EmulatorController:
     
     def input_text(self, text):
         """Input text (escapes special characters)"""
-        # Clear selection first
-        self.run_adb("shell input keyevent KEYCODE_CTRL_LEFT KEYCODE_A")
-        time.sleep(0.2)
+        # Clear selection first - the shell runs commands in order, so the
+        # text can be queued right behind it
+        self.run_adb("shell input keyevent KEYCODE_CTRL_LEFT KEYCODE_A", wait=False)
         # Input text (handle special chars)
         text_escaped = text.replace(' ', '%s').replace('&', '\\&')
         self.run_adb(f'shell input text "{text_escaped}"')
-        time.sleep(0.3)
     
     def send_key(self, keycode):
         """Send key event"""
         self.run_adb(f"shell input keyevent {keycode}")
-        time.sleep(0.3)
     
     def swipe(self, x1, y1, x2, y2, duration=300):
         """Swipe gesture"""
         self.run_adb(f"shell input swipe {x1} {y1} {x2} {y2} {duration}")
-        time.sleep(0.5)
 
 
 def get_emulator_list():
@@ -191,15 +429,14 @@ def login_user(emulator, credentials):
     emulator.take_screenshot(f"login_start_{credentials['email'].split('@')[0]}")
     
     # Find and tap email/username field
-    # Try common field identifiers
-    email_field = (emulator.find_element_by_id('email') or 
-                   emulator.find_element_by_id('username') or
-                   emulator.find_element_by_text('Email', exact=False) or
-                   emulator.find_element_by_text('Username', exact=False))
+    # Try common field identifiers - the app may still be starting up
+    email_field = emulator.wait_for_element([('id', 'email'), ('id', 'username'),
+                                             ('text', 'Email'), ('text', 'Username')])
     
+    # Taps and key events are delivered in order, so the tap has focused the
+    # field by the time the text arrives
     if email_field:
         emulator.tap_element(email_field)
-        time.sleep(0.5)
     else:
         # Fallback: tap approximate center of screen (adjust based on your UI)
         print("[WARNING] Email field not found, using approximate coordinates")
@@ -207,34 +444,27 @@ def login_user(emulator, credentials):
     
     # Enter email
     emulator.input_text(credentials['email'])
-    time.sleep(1)
     
     # Find password field
-    password_field = (emulator.find_element_by_id('password') or
-                      emulator.find_element_by_text('Password', exact=False))
+    password_field = emulator.wait_for_element([('id', 'password'), ('text', 'Password')], timeout=5)
     
     if password_field:
         emulator.tap_element(password_field)
     else:
         emulator.tap(500, 500)  # Approximate
     
-    time.sleep(0.5)
-    
     # Enter password
     emulator.input_text(credentials['password'])
-    time.sleep(1)
     
     # Find and tap login button
-    login_btn = (emulator.find_element_by_text('Login', exact=False) or
-                 emulator.find_element_by_text('Sign In', exact=False) or
-                 emulator.find_element_by_id('login'))
+    login_btn = emulator.wait_for_element([('text', 'Login'), ('text', 'Sign In'), ('id', 'login')], timeout=5)
     
     if login_btn:
         emulator.tap_element(login_btn)
     else:
         emulator.tap(500, 600)  # Approximate
     
-    time.sleep(STEP_DELAY)
+    emulator.wait_for_idle()
     emulator.take_screenshot(f"login_complete_{credentials['email'].split('@')[0]}")
 
 
@@ -249,7 +479,7 @@ def create_shared_ride(emulator, coords):
     
     # Find pickup location field and enter coordinates
     # Adjust these based on your actual UI
-    pickup_lat_field = emulator.find_element_by_id('pickup_lat') or emulator.find_element_by_text('Pickup', exact=False)
+    pickup_lat_field = emulator.wait_for_element([('id', 'pickup_lat'), ('text', 'Pickup')])
     if pickup_lat_field:
         emulator.tap_element(pickup_lat_field)
         emulator.input_text(coords['pickup_lat'])
@@ -266,64 +496,182 @@ def search_for_match(emulator, coords):
     pass
 
 
+def load_riders(path):
+    """Load rider specs from a JSON list or a CSV file
+    
+    Each rider needs email, password, pickup_lat, pickup_lng, dest_lat and
+    dest_lng, which are kept as strings (numbers, including 0, are fine). role is 'create' or 'search'; riders without one alternate,
+    starting with 'create'.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if str(path).endswith('.json'):
+            riders = json.load(f)
+        else:
+            riders = list(csv.DictReader(f))
+    
+    required = ['email', 'password', 'pickup_lat', 'pickup_lng', 'dest_lat', 'dest_lng']
+    for i, rider in enumerate(riders):
+        missing = [key for key in required if rider.get(key) is None or str(rider[key]).strip() == '']
+        if missing:
+            raise ValueError(f"Rider {i + 1} in {path} is missing {', '.join(missing)}")
+        # JSON specs may give coordinates as numbers; they are typed in as text
+        for key in required:
+            rider[key] = str(rider[key]).strip()
+        rider['role'] = rider.get('role') or ('create' if i % 2 == 0 else 'search')
+        if rider['role'] not in ('create', 'search'):
+            raise ValueError(f"Rider {i + 1} in {path} has unknown role '{rider['role']}'")
+    return riders
+
+
+def default_riders():
+    """The original two-rider scenario: rider 1 creates, rider 2 searches"""
+    return [
+        {**EMULATOR1, **COORDS1, 'role': 'create'},
+        {**EMULATOR2, **COORDS2, 'role': 'search'},
+    ]
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class ScenarioScheduler:
+    """Runs riders across all emulators, one phase at a time
+    
+    Riders are dealt round-robin onto the emulators; an emulator with more
+    than one rider runs them in waves, clearing app data between riders.
+    Every emulator runs its own pipeline in its own thread, and a barrier
+    after each phase keeps them in step - so every ride of a wave has been
+    created before anyone in that wave searches for a match.
+    """
+    PHASES = ['launch', 'login', 'create', 'search']
+    
+    def __init__(self, serials, riders, app_package=APP_PACKAGE, barrier_timeout=300):
+        self.controllers = [EmulatorController(serial) for serial in serials]
+        self.riders = riders
+        self.app_package = app_package
+        self.waves = -(-len(riders) // len(serials))
+        self.barrier = threading.Barrier(len(serials), timeout=barrier_timeout)
+        self.latencies = {phase: [] for phase in self.PHASES}
+        self.failures = {phase: 0 for phase in self.PHASES}
+        self.lock = threading.Lock()
+    
+    def run_phase(self, phase, emulator, rider, first):
+        if phase == 'launch':
+            if not first:
+                # Log the previous rider out
+                emulator.run_adb(f"shell pm clear {self.app_package}")
+            emulator.run_adb(f"shell monkey -p {self.app_package} -c android.intent.category.LAUNCHER 1")
+            emulator.wait_for_idle()
+            emulator.take_screenshot(f"01_app_launched_{rider['email'].split('@')[0]}")
+        elif phase == 'login':
+            login_user(emulator, rider)
+        elif phase == 'create' and rider['role'] == 'create':
+            create_shared_ride(emulator, rider)
+            emulator.wait_for_idle()
+        elif phase == 'search' and rider['role'] == 'search':
+            search_for_match(emulator, rider)
+            emulator.wait_for_idle()
+        else:
+            return False
+        return True
+    
+    def run_device(self, index):
+        try:
+            self.run_pipeline(self.controllers[index], index)
+        except threading.BrokenBarrierError:
+            raise
+        except Exception:
+            # Don't leave the other emulators waiting for this one
+            self.barrier.abort()
+            raise
+        finally:
+            self.controllers[index].close()
+    
+    def run_pipeline(self, emulator, index):
+        # Unlock device
+        emulator.send_key("KEYCODE_WAKEUP")
+        emulator.wait_for_idle()
+        emulator.send_key("KEYCODE_MENU")
+        
+        for wave in range(self.waves):
+            rider_index = wave * len(self.controllers) + index
+            rider = self.riders[rider_index] if rider_index < len(self.riders) else None
+            for phase in self.PHASES:
+                if rider is not None:
+                    started = time.perf_counter()
+                    try:
+                        ran = self.run_phase(phase, emulator, rider, first=wave == 0)
+                    except Exception as e:
+                        print(f"[ERROR] {emulator.serial}: {phase} failed for {rider['email']}: {e}")
+                        with self.lock:
+                            self.failures[phase] += 1
+                    else:
+                        if ran:
+                            with self.lock:
+                                self.latencies[phase].append(time.perf_counter() - started)
+                
+                # Emulators without a rider in this wave still keep the others in step
+                if self.barrier.wait() == 0:
+                    print(f"[STEP] Wave {wave + 1}/{self.waves}: {phase} done on all emulators")
+    
+    def run(self):
+        print(f"[STEP] Running {len(self.riders)} rider(s) on {len(self.controllers)} emulator(s) "
+              f"in {self.waves} wave(s)")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.controllers)) as executor:
+            for job in [executor.submit(self.run_device, i) for i in range(len(self.controllers))]:
+                try:
+                    job.result()
+                except threading.BrokenBarrierError:
+                    print("[ERROR] Scenario aborted - an emulator failed or missed the phase barrier")
+                except Exception as e:
+                    print(f"[ERROR] Emulator pipeline failed: {e}")
+        return time.perf_counter() - started
+    
+    def report(self, elapsed):
+        print()
+        print(f"{'phase':>8}  {'riders':>6}  {'failed':>6}  {'p50 (s)':>8}  {'p90 (s)':>8}  {'p99 (s)':>8}  {'max (s)':>8}")
+        for phase in self.PHASES:
+            ordered = sorted(self.latencies[phase])
+            if not ordered:
+                print(f"{phase:>8}  {0:>6}  {self.failures[phase]:>6}  {'-':>8}  {'-':>8}  {'-':>8}  {'-':>8}")
+                continue
+            print(f"{phase:>8}  {len(ordered):>6}  {self.failures[phase]:>6}  {percentile(ordered, 0.5):>8.2f}  "
+                  f"{percentile(ordered, 0.9):>8.2f}  {percentile(ordered, 0.99):>8.2f}  {ordered[-1]:>8.2f}")
+        print(f"[INFO] Scenario took {elapsed:.1f}s")
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Shared ride test across all connected emulators')
+    parser.add_argument('-r', '--riders', help='Rider spec file (.json list or .csv); default: the two built-in riders')
+    parser.add_argument('-s', '--serials', nargs='+', help='Emulator serials (default: auto-detect)')
+    parser.add_argument('--package', default=APP_PACKAGE, help='App package to launch')
+    parser.add_argument('--barrier-timeout', type=float, default=300,
+                        help='Seconds to wait for every emulator to finish a phase')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Automated Shared Ride Testing for Android Emulators")
     print("=" * 60)
     
+    riders = load_riders(args.riders) if args.riders else default_riders()
+    
     # Get available emulators
-    emulators = get_emulator_list()
-    if len(emulators) < 2:
-        print(f"[ERROR] Need at least 2 emulators. Found: {len(emulators)}")
+    emulators = args.serials or get_emulator_list()
+    if not emulators:
+        print("[ERROR] No emulators found.")
         print("[INFO] Start emulators with: emulator -avd <avd_name> &")
-        return
-    
-    EMULATOR1['serial'] = emulators[0]
-    EMULATOR2['serial'] = emulators[1]
-    
-    print(f"[SUCCESS] Emulator 1: {EMULATOR1['serial']}")
-    print(f"[SUCCESS] Emulator 2: {EMULATOR2['serial']}")
-    
-    em1 = EmulatorController(EMULATOR1['serial'])
-    em2 = EmulatorController(EMULATOR2['serial'])
-    
-    # Unlock devices
-    print("[STEP] Unlocking devices...")
-    em1.send_key("KEYCODE_WAKEUP")
-    em2.send_key("KEYCODE_WAKEUP")
-    time.sleep(2)
-    em1.send_key("KEYCODE_MENU")
-    em2.send_key("KEYCODE_MENU")
-    
-    # Launch app (parallel)
-    print("[STEP] Launching app on both emulators...")
-    app_package = "com.ovoride.rider"  # Adjust as needed
-    
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        executor.submit(lambda: em1.run_adb(f"shell monkey -p {app_package} -c android.intent.category.LAUNCHER 1"))
-        executor.submit(lambda: em2.run_adb(f"shell monkey -p {app_package} -c android.intent.category.LAUNCHER 1"))
-    
-    time.sleep(5)
-    em1.take_screenshot("01_app_launched")
-    em2.take_screenshot("01_app_launched")
-    
-    # Login (parallel)
-    print("[STEP] Logging in users...")
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        executor.submit(login_user, em1, EMULATOR1)
-        executor.submit(login_user, em2, EMULATOR2)
-    
-    time.sleep(STEP_DELAY)
-    
-    # Create shared ride on emulator 1
-    print("[STEP] Emulator 1 creating shared ride...")
-    create_shared_ride(em1, COORDS1)
-    time.sleep(STEP_DELAY)
-    
-    # Search for match on emulator 2
-    print("[STEP] Emulator 2 searching for matches...")
-    search_for_match(em2, COORDS2)
-    time.sleep(STEP_DELAY)
+        sys.exit(1)
+    # More emulators than riders would only wait at the barriers
+    emulators = emulators[:len(riders)]
+    
+    print(f"[SUCCESS] Using {len(emulators)} emulator(s): {', '.join(emulators)}")
+    
+    scheduler = ScenarioScheduler(emulators, riders, args.package, args.barrier_timeout)
+    elapsed = scheduler.run()
+    scheduler.report(elapsed)
     
     print("[SUCCESS] Test sequence completed!")
     print(f"[INFO] Screenshots saved in: {SCREENSHOT_DIR.absolute()}")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Benchmark the login flow of automate_shared_ride_python.py on one emulator.
+
+Runs the login flow twice. The legacy run is the original login_user()
+on the original controller: one adb process per command with a sleep
+after each, a dump/pull/rm of the UI hierarchy and a fresh parse for
+every element lookup, and fixed sleeps between steps. The current run is
+login_user() on the current controller: shell commands through a
+persistent adb shell session, exec-out dumps, cached UI snapshots and
+waits that poll for elements instead of sleeping. Reports the wall time
+and the number of adb processes started for each.
+
+Usage: python bench_login_flow.py [-s emulator-5554] [--runs 3]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+
+from automate_shared_ride_python import EMULATOR1, EmulatorController, get_emulator_list, login_user
+
+LEGACY_STEP_DELAY = 3  # seconds, STEP_DELAY before the polling waits
+
+
+class LegacyController(EmulatorController):
+    """EmulatorController as it was before the persistent shell session and UI snapshots"""
+
+    def run_adb(self, command, wait=True):
+        cmd = ['adb', '-s', self.serial] + command.split()
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            if wait:
+                time.sleep(0.5)
+            return result.stdout.strip()
+        except subprocess.TimeoutExpired:
+            print(f"[ERROR] ADB command timeout: {' '.join(cmd)}")
+            return ""
+
+    def tap(self, x, y):
+        self.run_adb(f"shell input tap {x} {y}")
+        time.sleep(0.5)
+
+    def input_text(self, text):
+        self.run_adb("shell input keyevent KEYCODE_CTRL_LEFT KEYCODE_A")
+        time.sleep(0.2)
+        text_escaped = text.replace(' ', '%s').replace('&', '\\&')
+        self.run_adb(f'shell input text "{text_escaped}"')
+        time.sleep(0.3)
+
+    def send_key(self, keycode):
+        self.run_adb(f"shell input keyevent {keycode}")
+        time.sleep(0.3)
+
+    def get_ui_xml(self):
+        xml_path = f"/sdcard/ui_dump_{int(time.time())}.xml"
+        self.run_adb(f"shell uiautomator dump {xml_path}")
+        local_xml = f"ui_dump_{self.serial}.xml"
+        self.run_adb(f"pull {xml_path} {local_xml}")
+        self.run_adb(f"shell rm {xml_path}")
+        if os.path.exists(local_xml):
+            with open(local_xml, 'r', encoding='utf-8') as f:
+                return f.read()
+        return None
+
+    def find_element_by_text(self, text, exact=False):
+        xml_content = self.get_ui_xml()
+        if not xml_content:
+            return None
+        try:
+            for node in ET.fromstring(xml_content).iter():
+                if 'text' in node.attrib:
+                    node_text = node.attrib['text']
+                    if (exact and node_text == text) or (not exact and text.lower() in node_text.lower()):
+                        match = re.match(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', node.attrib.get('bounds', ''))
+                        if match:
+                            x1, y1, x2, y2 = map(int, match.groups())
+                            return {'x': (x1 + x2) // 2, 'y': (y1 + y2) // 2,
+                                    'bounds': node.attrib['bounds'], 'text': node_text}
+        except Exception as e:
+            print(f"[ERROR] XML parsing error: {e}")
+        return None
+
+    def find_element_by_id(self, resource_id):
+        xml_content = self.get_ui_xml()
+        if not xml_content:
+            return None
+        try:
+            for node in ET.fromstring(xml_content).iter():
+                if 'resource-id' in node.attrib and resource_id in node.attrib['resource-id']:
+                    match = re.match(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', node.attrib.get('bounds', ''))
+                    if match:
+                        x1, y1, x2, y2 = map(int, match.groups())
+                        return {'x': (x1 + x2) // 2, 'y': (y1 + y2) // 2, 'bounds': node.attrib['bounds']}
+        except Exception as e:
+            print(f"[ERROR] XML parsing error: {e}")
+        return None
+
+
+def legacy_login_user(emulator, credentials):
+    """login_user() as it was, with its lookup order and fixed sleeps"""
+    emulator.take_screenshot(f"login_start_{credentials['email'].split('@')[0]}")
+
+    email_field = (emulator.find_element_by_id('email') or
+                   emulator.find_element_by_id('username') or
+                   emulator.find_element_by_text('Email', exact=False) or
+                   emulator.find_element_by_text('Username', exact=False))
+    if email_field:
+        emulator.tap_element(email_field)
+        time.sleep(0.5)
+    else:
+        emulator.tap(500, 400)
+    emulator.input_text(credentials['email'])
+    time.sleep(1)
+
+    password_field = (emulator.find_element_by_id('password') or
+                      emulator.find_element_by_text('Password', exact=False))
+    if password_field:
+        emulator.tap_element(password_field)
+    else:
+        emulator.tap(500, 500)
+    time.sleep(0.5)
+    emulator.input_text(credentials['password'])
+    time.sleep(1)
+
+    login_btn = (emulator.find_element_by_text('Login', exact=False) or
+                 emulator.find_element_by_text('Sign In', exact=False) or
+                 emulator.find_element_by_id('login'))
+    if login_btn:
+        emulator.tap_element(login_btn)
+    else:
+        emulator.tap(500, 600)
+    time.sleep(LEGACY_STEP_DELAY)
+    emulator.take_screenshot(f"login_complete_{credentials['email'].split('@')[0]}")
+
+
+class SpawnCounter:
+    """Counts adb processes started through subprocess while active
+
+    Only Popen is patched: subprocess.run starts its process through it,
+    so every spawn is seen exactly once.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.original = subprocess.Popen
+
+    def __enter__(self):
+        class CountedPopen(self.original):
+            def __init__(popen, cmd, *args, **kwargs):
+                self.count += cmd[0] == 'adb'
+                super().__init__(cmd, *args, **kwargs)
+
+        subprocess.Popen = CountedPopen
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen = self.original
+
+
+def bench(controller_class, login, serial, runs):
+    times, spawns = [], []
+    for _ in range(runs):
+        controller = controller_class(serial)
+        with SpawnCounter() as counter:
+            start = time.perf_counter()
+            login(controller, EMULATOR1)
+            controller.close()
+            times.append(time.perf_counter() - start)
+        spawns.append(counter.count)
+    return min(times), sum(times) / runs, max(spawns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the login flow before and after the adb and UI lookup changes')
+    parser.add_argument('-s', '--serial', help='Emulator serial (default: first detected)')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    serial = args.serial or next(iter(get_emulator_list()), None)
+    if not serial:
+        print("[ERROR] No emulators found. Start an emulator first.")
+        return
+
+    print(f"[INFO] Login flow on {serial}, best of {args.runs}")
+    print(f"{'controller':>12}  {'best (s)':>9}  {'avg (s)':>8}  {'adb spawns':>10}")
+    results = {}
+    for name, controller_class, login in [('legacy', LegacyController, legacy_login_user),
+                                          ('current', EmulatorController, login_user)]:
+        results[name] = bench(controller_class, login, serial, args.runs)
+        best, avg, spawns = results[name]
+        print(f"{name:>12}  {best:>9.2f}  {avg:>8.2f}  {spawns:>10}")
+    print(f"{'speedup':>12}  {results['legacy'][0] / results['current'][0]:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
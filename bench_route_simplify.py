@@ -0,0 +1,125 @@
+"""
+Benchmark route simplification in visualize_route.py on dense road geometry.
+
+Builds a log of requests matched to synthetic routes whose road geometry
+has a point every few meters, like the directions API overview polylines,
+then reports for each simplifier the route points kept per detail level,
+the simplification time and the size of the HTML, GeoJSON and binary
+output, against --simplify none (every point, one level).
+
+Usage: python bench_route_simplify.py [--routes 50] [--points 5000] [--requests 2000]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from visualize_route import (DEFAULT_TOLERANCE_M, LOD_LEVELS, SIMPLIFIERS, decode_polyline, export_data,
+                             read_request_log, render_batch, route_geometry, simplify_lines)
+
+
+def encode_polyline(latlng):
+    """Google polyline encoding, the inverse of decode_polyline()"""
+    encoded = []
+    for delta in np.diff(np.round(np.asarray(latlng) * 1e5).astype(np.int64), axis=0, prepend=0).ravel():
+        value = ~(delta << 1) if delta < 0 else delta << 1
+        while value >= 0x20:
+            encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        encoded.append(chr(value + 63))
+    return "".join(encoded)
+
+
+def make_route(rng, points, step_m=5.0):
+    """A road-like walk across Cairo: straight stretches, gentle bends and sharp turns"""
+    turn = rng.normal(0, 0.01, points)
+    turn[rng.random(points) < 0.005] += rng.choice([-1.5, 1.5], size=points)[:1]
+    heading = rng.uniform(0, 2 * np.pi) + np.cumsum(turn)
+    lat = 30.05 + np.cumsum(step_m * np.cos(heading)) / 111_320
+    lng = 31.25 + np.cumsum(step_m * np.sin(heading)) / (111_320 * np.cos(np.radians(30.05)))
+    return np.column_stack((lat, lng))
+
+
+def write_log(path, routes, points, requests, seed=0):
+    rng = np.random.default_rng(seed)
+    lines = [make_route(rng, points) for _ in range(routes)]
+    route_objects = []
+    for r, line in enumerate(lines):
+        # A stop every ~500 m along the road
+        stops = [{"id": r * 1000 + i, "name": f"Route {r + 1} stop {i + 1}", "latitude": f"{lat:.7f}",
+                  "longitude": f"{lng:.7f}", "pivot": {"order": i + 1}}
+                 for i, (lat, lng) in enumerate(line[::100])]
+        route_objects.append({"id": r + 1, "name": f"Route {r + 1}", "code": f"R{r + 1:03d}", "stops": stops,
+                              "directions_data": {"polyline": encode_polyline(line)}})
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(requests):
+            route = route_objects[rng.integers(routes)]
+            start, end = sorted(rng.choice(len(route["stops"]), 2, replace=False))
+            pickup, dropoff = route["stops"][start], route["stops"][end]
+            request = {"start_lat": float(pickup["latitude"]) + rng.normal(0, 0.003),
+                       "start_lng": float(pickup["longitude"]) + rng.normal(0, 0.003),
+                       "end_lat": float(dropoff["latitude"]) + rng.normal(0, 0.003),
+                       "end_lng": float(dropoff["longitude"]) + rng.normal(0, 0.003)}
+            response = {"success": True, "start_stop": pickup, "end_stop": dropoff, "matched_routes": [route]}
+            f.write(json.dumps({"request": request, "response": response}) + "\n")
+    return lines
+
+
+def quietly(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route simplification and detail levels")
+    parser.add_argument("--routes", type=int, default=50)
+    parser.add_argument("--points", type=int, default=5000, help="Road geometry points per route")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE_M)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "requests.jsonl")
+        lines = write_log(log_path, args.routes, args.points, args.requests)
+        decoded = [route_geometry(response["matched_routes"][0]) for _, response in read_request_log(log_path)]
+        error = max(np.abs(line - decode_polyline(encode_polyline(line))).max() for line in lines)
+        print(f"{args.routes} routes x {args.points} points, {args.requests} requests; "
+              f"{len(decoded)} polylines decoded, max round-trip error {error:.1e} deg")
+
+        total = args.routes * args.points
+        zooms = [f"z{min_zoom}-{max_zoom}" for min_zoom, max_zoom, _ in LOD_LEVELS]
+        print(f"{'method':>6}  {'simplify (s)':>12}  " + "  ".join(f"{zoom:>8}" for zoom in zooms)
+              + f"  {'html':>11}  {'geojson':>11}  {'binary':>11}")
+        sizes = {}
+        for method in ["none"] + list(SIMPLIFIERS):
+            start = time.perf_counter()
+            levels = simplify_lines(lines, method, args.tolerance)
+            elapsed = time.perf_counter() - start
+            kept = [f"{len(level['coords']) / total:>8.1%}" for level in levels]
+            kept += [f"{'':>8}"] * (len(LOD_LEVELS) - len(kept))
+
+            sizes[method] = []
+            for fmt, ext in [("html", ".html"), ("geojson", ".geojson"), ("binary", ".bin")]:
+                output = os.path.join(tmp, method + ext)
+                if fmt == "html":
+                    quietly(render_batch, log_path, output, method, args.tolerance)
+                else:
+                    quietly(export_data, read_request_log(log_path), output, fmt, method, args.tolerance)
+                sizes[method].append(os.path.getsize(output))
+            print(f"{method:>6}  {elapsed:>12.3f}  " + "  ".join(kept) + "  "
+                  + "  ".join(f"{size:>11,}" for size in sizes[method]))
+
+        for method in SIMPLIFIERS:
+            print(f"{method:>6}  size vs none: " + "  ".join(
+                f"{fmt} {new / old:.1%}" for fmt, new, old in zip(["html", "geojson", "binary"],
+                                                                   sizes[method], sizes["none"])))
+
+
+if __name__ == "__main__":
+    main()
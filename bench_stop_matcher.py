@@ -0,0 +1,114 @@
+"""
+Benchmark stop_matcher.py on a synthetic Cairo shuttle network.
+
+Builds a random network of stops and routes over greater Cairo, replays
+millions of random requests through StopIndex.nearest() and
+match_routes(), and reports requests per second. A sample of the requests
+is also matched by a plain-Python port of ShuttleController::matchRoute
+to check that both give the same walking distance.
+
+Usage: python bench_stop_matcher.py [--requests 1000000 5000000] [--stops 2000] [--routes 150]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from stop_matcher import DEFAULT_RADIUS_M, ShuttleNetwork, StopIndex, haversine, match_routes
+
+# Greater Cairo, roughly 6th of October to New Cairo
+CAIRO_BOUNDS = (29.95, 30.15, 31.00, 31.50)
+
+
+def make_network(stops, routes, stops_per_route, seed=0):
+    rng = np.random.default_rng(seed)
+    lat_min, lat_max, lng_min, lng_max = CAIRO_BOUNDS
+    lat = rng.uniform(lat_min, lat_max, stops)
+    lng = rng.uniform(lng_min, lng_max, stops)
+    stop_rows = [(i + 1, f"Stop {i + 1}", f"{lat[i]:.7f}", f"{lng[i]:.7f}") for i in range(stops)]
+
+    route_stops = []
+    for route in range(routes):
+        # Walk from a random stop to successively nearest unvisited stops so routes look like routes
+        current = int(rng.integers(stops))
+        visited = [current]
+        for order in range(1, stops_per_route):
+            d = haversine(lat[current], lng[current], lat, lng)
+            d[visited] = np.inf
+            current = int(np.argmin(d + rng.uniform(0, 1500, stops)))
+            visited.append(current)
+        route_stops += [(route + 1, stop + 1, order + 1) for order, stop in enumerate(visited)]
+    return ShuttleNetwork(stop_rows, route_stops)
+
+
+def make_requests(network, count, seed=1):
+    """Requests near random route stops, so a good share of them match"""
+    rng = np.random.default_rng(seed)
+    route = rng.integers(len(network.route_stops), size=count)
+    lengths = np.array([len(stops) for stops in network.route_stops])
+    first = (rng.random(count) * (lengths[route] - 1)).astype(np.int64)
+    second = (rng.random(count) * (lengths[route] - 1)).astype(np.int64) + 1
+    padded = np.full((len(network.route_stops), lengths.max()), 0)
+    for r, stops in enumerate(network.route_stops):
+        padded[r, :len(stops)] = stops
+    start, end = padded[route, first], padded[route, second]
+    # Up to ~1.2km away in each direction, so some fall outside the radius
+    jitter = rng.normal(0, 0.005, size=(4, count))
+    return (network.lat[start] + jitter[0], network.lng[start] + jitter[1],
+            network.lat[end] + jitter[2], network.lng[end] + jitter[3])
+
+
+def reference_walk(network, start_lat, start_lng, end_lat, end_lng, radius):
+    """ShuttleController::matchRoute in plain Python, without schedules"""
+    start_d = haversine(start_lat, start_lng, network.lat, network.lng)
+    end_d = haversine(end_lat, end_lng, network.lat, network.lng)
+    best = np.inf
+    for stops in network.route_stops:
+        for i, s in enumerate(stops):
+            if start_d[s] > radius:
+                continue
+            for e in stops[i + 1:]:
+                if e != s and end_d[e] <= radius:
+                    best = min(best, start_d[s] + end_d[e])
+    return best
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the offline stop matcher")
+    parser.add_argument("--requests", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--stops", type=int, default=2000)
+    parser.add_argument("--routes", type=int, default=150)
+    parser.add_argument("--stops-per-route", type=int, default=20)
+    parser.add_argument("--radius", type=float, default=DEFAULT_RADIUS_M)
+    parser.add_argument("--check", type=int, default=2000, help="Requests to verify against the reference")
+    args = parser.parse_args()
+
+    network = make_network(args.stops, args.routes, args.stops_per_route)
+    build_time, index = timed(StopIndex, network, args.radius)
+    print(f"{args.stops} stops, {args.routes} routes; index built in {build_time * 1000:.1f} ms "
+          f"({len(index.cell_keys)} cells, up to {index.max_per_cell} stops per cell)")
+
+    sample = make_requests(network, args.check, seed=2)
+    route, _, _, walk = match_routes(index, *sample, radius=args.radius)
+    expected = np.array([reference_walk(network, *point, args.radius) for point in zip(*sample)])
+    agree = np.isclose(walk, expected) | (np.isinf(walk) & np.isinf(expected))
+    print(f"Reference check: {agree.sum()}/{args.check} agree, {np.isfinite(expected).sum()} matchable")
+
+    print(f"{'requests':>10}  {'nearest (s)':>11}  {'req/s':>10}  {'match (s)':>9}  {'req/s':>10}  {'matched':>8}")
+    for count in args.requests:
+        start_lat, start_lng, end_lat, end_lng = make_requests(network, count)
+        nearest_time, _ = timed(index.nearest, start_lat, start_lng)
+        match_time, (route, _, _, _) = timed(match_routes, index, start_lat, start_lng, end_lat, end_lng)
+        print(f"{count:>10}  {nearest_time:>11.2f}  {count / nearest_time:>10,.0f}  "
+              f"{match_time:>9.2f}  {count / match_time:>10,.0f}  {(route >= 0).mean():>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Demand heatmap of shuttle request logs against existing stops.
+
+Streams a JSONL request log (the format visualize_route.py --batch reads)
+in chunks, bins every requested origin and destination into hexagonal or
+geohash cells with vectorized NumPy, and keeps per-cell counts plus a
+histogram of the walk from each point to its nearest stop. Memory grows
+with the number of cells touched, not the number of requests.
+
+Stops come from a network export (anything stop_matcher.load_network
+reads) or, without --network, from the stops seen in the log itself.
+
+The output is a folium map with the cell counts as a heat layer, the cells
+shaded by median walk with their stats in a tooltip, and the stops. With
+--format geojson the cells are written as polygons instead, for GIS tools.
+
+Usage: python demand_heatmap.py requests.jsonl [--network network.json] [--cells hex|geohash]
+                                [--hex-size 250] [--precision 7] [--format html|geojson] [-o OUTPUT]
+"""
+
+import argparse
+import itertools
+import json
+import os
+
+import numpy as np
+
+from stop_matcher import DEFAULT_RADIUS_M, EARTH_RADIUS_M, ShuttleNetwork, StopIndex, load_network
+from visualize_route import read_request_log, response_matches
+
+OUTPUT_FILE = "demand_heatmap.html"
+OUTPUT_EXTENSIONS = {"html": ".html", "geojson": ".geojson"}
+CHUNK_SIZE = 100_000      # requests binned per vectorized block
+DEFAULT_HEX_SIZE_M = 250  # hexagon edge length
+DEFAULT_PRECISION = 7     # geohash characters, ~150 x 150 m cells at Cairo's latitude
+WALK_BIN_M = 50           # walking distance histogram resolution
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+class HexGrid:
+    """Pointy-top hexagons of a given edge length on a local metric projection
+
+    Projects like StopIndex (meters around a reference latitude) and
+    identifies each hexagon by its axial (q, r) coordinates packed into
+    one int64 key.
+    """
+
+    def __init__(self, size_m=DEFAULT_HEX_SIZE_M, cos_lat=1.0):
+        self.size_m = size_m
+        self.cos_lat = cos_lat
+
+    def label(self):
+        return f"{self.size_m:g} m hexagons"
+
+    def _project(self, lat, lng):
+        return (np.radians(np.asarray(lng, dtype=np.float64)) * EARTH_RADIUS_M * self.cos_lat,
+                np.radians(np.asarray(lat, dtype=np.float64)) * EARTH_RADIUS_M)
+
+    def _unproject(self, x, y):
+        return np.degrees(y / EARTH_RADIUS_M), np.degrees(x / (EARTH_RADIUS_M * self.cos_lat))
+
+    def keys(self, lat, lng):
+        x, y = self._project(lat, lng)
+        q = (np.sqrt(3) / 3 * x - y / 3) / self.size_m
+        r = (2 / 3 * y) / self.size_m
+        # Round in cube coordinates, then fix the component that moved most
+        s = -q - r
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq = np.where(fix_q, -rr - rs, rq)
+        rr = np.where(fix_r, -rq - rs, rr)
+        return (rq.astype(np.int64) << 32) + (rr.astype(np.int64) & 0xFFFFFFFF)
+
+    @staticmethod
+    def _axial(keys):
+        low = keys & 0xFFFFFFFF
+        r = np.where(low >= 1 << 31, low - (1 << 32), low)
+        return (keys - low) >> 32, r
+
+    def centers(self, keys):
+        q, r = self._axial(keys)
+        return self._unproject(self.size_m * np.sqrt(3) * (q + r / 2), self.size_m * 1.5 * r)
+
+    def polygons(self, keys):
+        """(cells, 6, 2) lat/lng corners"""
+        q, r = self._axial(keys)
+        x = self.size_m * np.sqrt(3) * (q + r / 2)
+        y = self.size_m * 1.5 * r
+        angles = np.radians(30 + 60 * np.arange(6))
+        lat, lng = self._unproject(x[:, None] + self.size_m * np.cos(angles),
+                                   y[:, None] + self.size_m * np.sin(angles))
+        return np.stack((lat, lng), axis=-1)
+
+    def names(self, keys):
+        q, r = self._axial(keys)
+        return [f"{a},{b}" for a, b in zip(q.tolist(), r.tolist())]
+
+
+class GeohashGrid:
+    """Geohash cells of a given precision, keyed by their interleaved bits"""
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.bits = 5 * precision
+        self.lng_bits = (self.bits + 1) // 2
+        self.lat_bits = self.bits // 2
+
+    def label(self):
+        return f"geohash precision {self.precision}"
+
+    def keys(self, lat, lng):
+        lat_i = np.clip(((np.asarray(lat) + 90) / 180 * (1 << self.lat_bits)).astype(np.int64),
+                        0, (1 << self.lat_bits) - 1)
+        lng_i = np.clip(((np.asarray(lng) + 180) / 360 * (1 << self.lng_bits)).astype(np.int64),
+                        0, (1 << self.lng_bits) - 1)
+        # Bits alternate longitude, latitude, starting with the top longitude bit
+        keys = np.zeros(lat_i.shape, dtype=np.int64)
+        for i in range(self.bits):
+            value, width = (lng_i, self.lng_bits) if i % 2 == 0 else (lat_i, self.lat_bits)
+            keys = (keys << 1) | ((value >> (width - 1 - i // 2)) & 1)
+        return keys
+
+    def _split(self, keys):
+        lat_i = np.zeros(len(keys), dtype=np.int64)
+        lng_i = np.zeros(len(keys), dtype=np.int64)
+        for i in range(self.bits):
+            bit = (keys >> (self.bits - 1 - i)) & 1
+            if i % 2 == 0:
+                lng_i = (lng_i << 1) | bit
+            else:
+                lat_i = (lat_i << 1) | bit
+        lat_step, lng_step = 180 / (1 << self.lat_bits), 360 / (1 << self.lng_bits)
+        return lat_i * lat_step - 90, lng_i * lng_step - 180, lat_step, lng_step
+
+    def centers(self, keys):
+        south, west, lat_step, lng_step = self._split(keys)
+        return south + lat_step / 2, west + lng_step / 2
+
+    def polygons(self, keys):
+        """(cells, 4, 2) lat/lng corners"""
+        south, west, lat_step, lng_step = self._split(keys)
+        lat = south[:, None] + lat_step * np.array([0, 0, 1, 1])
+        lng = west[:, None] + lng_step * np.array([0, 1, 1, 0])
+        return np.stack((lat, lng), axis=-1)
+
+    def names(self, keys):
+        chars = np.array(list(GEOHASH_ALPHABET))
+        shifts = 5 * np.arange(self.precision - 1, -1, -1)
+        return ["".join(row) for row in chars[(keys[:, None] >> shifts) & 31]]
+
+
+class DemandCells:
+    """Per-cell origin/destination counts and walks to the nearest stop
+
+    Each chunk of points is reduced to its cells with np.unique and
+    bincount, then merged into the running totals, so only one chunk and
+    the cells seen so far are held. Walks are kept as a histogram of
+    WALK_BIN_M bins up to the index radius; points with no stop within the
+    radius are counted separately.
+    """
+
+    ORIGINS, DESTINATIONS, NO_STOP, HISTOGRAM = 0, 1, 2, 3
+
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+        self.walk_bins = int(np.ceil(index.radius / WALK_BIN_M))
+        self.columns = self.HISTOGRAM + self.walk_bins
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros((0, self.columns), dtype=np.int64)
+        self.walk_sum = np.zeros(0)
+
+    def add(self, lat, lng, column):
+        """Count points as ORIGINS or DESTINATIONS"""
+        if not len(lat):
+            return
+        cell_keys, cell = np.unique(self.grid.keys(lat, lng), return_inverse=True)
+        _, walk = self.index.nearest(lat, lng)
+        covered = np.isfinite(walk)
+        walk_bin = np.minimum((walk[covered] // WALK_BIN_M).astype(np.int64), self.walk_bins - 1)
+
+        flat = np.concatenate((cell * self.columns + column,
+                               cell[~covered] * self.columns + self.NO_STOP,
+                               cell[covered] * self.columns + self.HISTOGRAM + walk_bin))
+        counts = np.bincount(flat, minlength=len(cell_keys) * self.columns).reshape(-1, self.columns)
+        walk_sum = np.bincount(cell[covered], weights=walk[covered], minlength=len(cell_keys))
+
+        # Both key arrays are sorted and unique, so each lands on distinct rows
+        keys = np.union1d(self.keys, cell_keys)
+        merged = np.zeros((len(keys), self.columns), dtype=np.int64)
+        merged_sum = np.zeros(len(keys))
+        for old_keys, old_counts, old_sum in ((self.keys, self.counts, self.walk_sum),
+                                              (cell_keys, counts, walk_sum)):
+            rows = np.searchsorted(keys, old_keys)
+            merged[rows] += old_counts
+            merged_sum[rows] += old_sum
+        self.keys, self.counts, self.walk_sum = keys, merged, merged_sum
+
+    def stats(self):
+        """Per-cell arrays: points, origins, destinations, no_stop, mean/median/p90 walk in meters
+
+        Median and p90 are the upper edge of their histogram bin, so they
+        are accurate to WALK_BIN_M; mean is exact. Walk stats cover points
+        with a stop in range and are NaN for cells without any.
+        """
+        histogram = self.counts[:, self.HISTOGRAM:]
+        covered = histogram.sum(axis=1)
+        cumulative = histogram.cumsum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(covered > 0, self.walk_sum / covered, np.nan)
+
+        def percentile(p):
+            target = np.ceil(p * covered)[:, None]
+            edge = ((cumulative < target).sum(axis=1) + 1) * WALK_BIN_M
+            return np.where(covered > 0, np.minimum(edge, self.index.radius), np.nan)
+
+        return {
+            "points": self.counts[:, self.ORIGINS] + self.counts[:, self.DESTINATIONS],
+            "origins": self.counts[:, self.ORIGINS],
+            "destinations": self.counts[:, self.DESTINATIONS],
+            "no_stop": self.counts[:, self.NO_STOP],
+            "mean_walk": mean,
+            "median_walk": percentile(0.5),
+            "p90_walk": percentile(0.9),
+        }
+
+
+def network_from_log(log_path):
+    """Every stop on a matched route in the log, as a ShuttleNetwork"""
+    stops, route_stops = {}, set()
+    for _, response in read_request_log(log_path):
+        for route, start_stop, end_stop in response_matches(response):
+            for stop in route["stops"]:
+                stops[int(stop["id"])] = (int(stop["id"]), stop["name"], stop["latitude"], stop["longitude"])
+                route_stops.add((int(route["id"]), int(stop["id"]), int(stop["pivot"]["order"])))
+            for stop in (start_stop, end_stop):
+                if stop:
+                    stops[int(stop["id"])] = (int(stop["id"]), stop["name"], stop["latitude"], stop["longitude"])
+    return ShuttleNetwork(list(stops.values()), sorted(route_stops))
+
+
+def aggregate_demand(log_path, cells, chunk_size=CHUNK_SIZE):
+    """Stream the log into cells, chunk_size requests at a time; returns the request count"""
+    requests = 0
+    points = (request for request, _ in read_request_log(log_path) if "start_lat" in request)
+    while True:
+        chunk = list(itertools.islice(points, chunk_size))
+        if not chunk:
+            return requests
+        coords = np.array([(r["start_lat"], r["start_lng"], r["end_lat"], r["end_lng"]) for r in chunk],
+                          dtype=np.float64)
+        cells.add(coords[:, 0], coords[:, 1], DemandCells.ORIGINS)
+        cells.add(coords[:, 2], coords[:, 3], DemandCells.DESTINATIONS)
+        requests += len(chunk)
+
+
+def walk_color(median_walk):
+    """Green within a short walk, orange for a long one, red if far or no stop in range"""
+    if median_walk is None or np.isnan(median_walk) or median_walk > 600:
+        return "red"
+    return "green" if median_walk <= 300 else "orange"
+
+
+def cell_features(cells, stats):
+    """GeoJSON polygon features for every cell with its stats as properties"""
+    names = cells.grid.names(cells.keys)
+    polygons = np.round(cells.grid.polygons(cells.keys)[:, :, ::-1], 6)  # GeoJSON is [lng, lat]
+    features = []
+    for i, name in enumerate(names):
+        ring = polygons[i].tolist()
+        properties = {"cell": name}
+        for field, values in stats.items():
+            value = values[i].item()
+            properties[field] = None if isinstance(value, float) and np.isnan(value) else round(value, 1)
+        features.append({"type": "Feature", "properties": properties,
+                         "geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]]}})
+    return features
+
+
+def print_busiest(cells, stats, top):
+    """The busiest cells with how far their requests are from a stop"""
+    names = cells.grid.names(cells.keys)
+    print(f"{'cell':>14}  {'requests':>8}  {'origins':>7}  {'dest.':>6}  {'no stop':>7}  "
+          f"{'mean (m)':>8}  {'median':>7}  {'p90':>6}")
+    for i in np.argsort(-stats["points"], kind="stable")[:top]:
+        walks = [f"{stats[field][i]:>{width}.0f}" if np.isfinite(stats[field][i]) else f"{'-':>{width}}"
+                 for field, width in (("mean_walk", 8), ("median_walk", 7), ("p90_walk", 6))]
+        print(f"{names[i]:>14}  {stats['points'][i]:>8}  {stats['origins'][i]:>7}  {stats['destinations'][i]:>6}  "
+              f"{stats['no_stop'][i] / stats['points'][i]:>7.0%}  " + "  ".join(walks))
+
+
+def render_heatmap(cells, stats, network, output_file):
+    """folium map: heat layer of cell counts, cells shaded by median walk, and the stops"""
+    import folium
+    from folium.plugins import HeatMap
+
+    lat, lng = cells.grid.centers(cells.keys)
+    polygons = cells.grid.polygons(cells.keys)
+    m = folium.Map(location=[float(lat.mean()), float(lng.mean())], zoom_start=12)
+    m.fit_bounds([[float(polygons[:, :, 0].min()), float(polygons[:, :, 1].min())],
+                  [float(polygons[:, :, 0].max()), float(polygons[:, :, 1].max())]])
+
+    # 1. Requested origins and destinations, weighted by cell count
+    points = stats["points"]
+    HeatMap(np.column_stack((np.round(lat, 6), np.round(lng, 6), points / points.max())).tolist(),
+            name="Demand", radius=20, blur=15).add_to(m)
+
+    # 2. Cells, green/orange/red by median walk to the nearest stop
+    fields = ["cell", "points", "origins", "destinations", "no_stop", "mean_walk", "median_walk", "p90_walk"]
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": cell_features(cells, stats)},
+        name="Walk to nearest stop",
+        show=False,
+        style_function=lambda feature: {"color": walk_color(feature["properties"]["median_walk"]),
+                                        "weight": 1, "fillOpacity": 0.25},
+        tooltip=folium.GeoJsonTooltip(fields=fields, aliases=["Cell", "Requests", "Origins", "Destinations",
+                                                              "No stop in range", "Mean walk (m)",
+                                                              "Median walk (m)", "90% walk (m)"]),
+    ).add_to(m)
+
+    # 3. Existing stops
+    stop_layer = folium.FeatureGroup(name="Stops").add_to(m)
+    for name, stop_lat, stop_lng in zip(network.stop_names, network.lat.tolist(), network.lng.tolist()):
+        folium.CircleMarker([stop_lat, stop_lng], radius=3, color="black", weight=1, fill=True,
+                            fill_opacity=0.8, tooltip=name).add_to(stop_layer)
+
+    folium.LayerControl().add_to(m)
+    m.save(output_file)
+    print(f"Map saved to {output_file} ({os.path.getsize(output_file):,} bytes)")
+
+
+def write_cells_geojson(cells, stats, totals, output_file):
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "properties": totals, "features": cell_features(cells, stats)},
+                  f, separators=(",", ":"), ensure_ascii=False)
+    print(f"Cells saved to {output_file} ({os.path.getsize(output_file):,} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bin shuttle requests into cells and compare them with stops")
+    parser.add_argument("log", help="JSONL log of request/response pairs")
+    parser.add_argument("--network", help="Stops/routes export for stop_matcher.load_network "
+                                          "(default: the stops seen in the log)")
+    parser.add_argument("--route-stops", help="route_stops CSV, with a stops CSV --network")
+    parser.add_argument("--cells", choices=["hex", "geohash"], default="hex")
+    parser.add_argument("--hex-size", type=float, default=DEFAULT_HEX_SIZE_M, help="Hexagon edge in meters")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION, help="Geohash length, 1-12")
+    parser.add_argument("--walk-radius", type=float, default=DEFAULT_RADIUS_M,
+                        help="Farthest stop counted as in range, in meters")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Requests binned at a time")
+    parser.add_argument("--top", type=int, default=10, help="Busiest cells to print")
+    parser.add_argument("--format", choices=list(OUTPUT_EXTENSIONS), default="html")
+    parser.add_argument("-o", "--output", help=f"Output file (default: {OUTPUT_FILE}, extension follows --format)")
+    args = parser.parse_args()
+    if not 1 <= args.precision <= 12:
+        parser.error("--precision must be between 1 and 12")
+
+    network = load_network(args.network, args.route_stops) if args.network else network_from_log(args.log)
+    if not len(network):
+        print("[ERROR] No stops to measure walks against; pass --network")
+        return
+    index = StopIndex(network, args.walk_radius)
+    grid = HexGrid(args.hex_size, index.cos_lat) if args.cells == "hex" else GeohashGrid(args.precision)
+    cells = DemandCells(grid, index)
+
+    requests = aggregate_demand(args.log, cells, args.chunk_size)
+    if not requests:
+        print(f"No requests in {args.log}, nothing to map")
+        return
+    stats = cells.stats()
+    print(f"{requests} requests in {len(cells.keys)} cells ({grid.label()}), {len(network)} stops; "
+          f"{stats['no_stop'].sum() / stats['points'].sum():.1%} of points have no stop "
+          f"within {args.walk_radius:.0f} m")
+    if args.top:
+        print_busiest(cells, stats, args.top)
+
+    output_file = args.output or os.path.splitext(OUTPUT_FILE)[0] + OUTPUT_EXTENSIONS[args.format]
+    if args.format == "geojson":
+        totals = {"requests": requests, "cells": grid.label(), "stops": len(network)}
+        write_cells_geojson(cells, stats, totals, output_file)
+    else:
+        render_heatmap(cells, stats, network, output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,19 +8,167 @@ NO automation of actions - just monitoring and capture
 import subprocess
 import time
 import os
+import io
+import json
+import zlib
+import hashlib
+import threading
+import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
 from datetime import datetime
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+DEDUP_MODES = ['link', 'skip', 'off']
+BOUNDS_RE = re.compile(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]')
+
+
+class UINode:
+    """One element of a UI hierarchy dump, flattened to what rendering and search use"""
+    __slots__ = ('depth', 'text', 'text_lower', 'resource_id', 'content_desc', 'class_name',
+                 'bounds', 'clickable', 'checkable', 'center')
+    
+    def __init__(self, attrib, depth):
+        self.depth = depth
+        self.text = attrib.get('text', '')
+        self.text_lower = self.text.lower()
+        self.resource_id = attrib.get('resource-id', '')
+        self.content_desc = attrib.get('content-desc', '')
+        self.class_name = attrib.get('class', '')
+        self.bounds = attrib.get('bounds', '')
+        self.clickable = attrib.get('clickable', 'false')
+        self.checkable = attrib.get('checkable', 'false')
+        match = BOUNDS_RE.match(self.bounds) if self.bounds else None
+        if match:
+            x1, y1, x2, y2 = map(int, match.groups())
+            self.center = ((x1 + x2) // 2, (y1 + y2) // 2)
+        else:
+            self.center = None
+
+
+def parse_node_table(source):
+    """Read a uiautomator dump (path or file object) into UINodes in document order
+    
+    A single iterparse pass; each element is cleared once its subtree is
+    done, so no element tree is kept around.
+    """
+    nodes = []
+    depth = -1
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            nodes.append(UINode(elem.attrib, depth))
+        else:
+            depth -= 1
+            elem.clear()
+    return nodes
+
+
+class FrameLog:
+    """Append-only store for captured frames under a fixed disk budget
+    
+    Frames are appended to segment files; index.jsonl records where each
+    one lives. XML is zlib-compressed, PNGs are stored as they are (they
+    are compressed already). Once the segments outgrow the budget, the
+    oldest segment is deleted along with its index entries, so the log
+    always holds the most recent frames.
+    """
+    
+    def __init__(self, directory, budget_bytes, segment_bytes=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / "index.jsonl"
+        self.budget_bytes = budget_bytes
+        # Evicting one segment frees at most ~1/8 of the budget
+        self.segment_bytes = segment_bytes or max(1 << 20, budget_bytes // 8)
+        self.lock = threading.Lock()
+        
+        self.segments = sorted(self.directory.glob("segment_*.bin"))
+        self.segment_number = int(self.segments[-1].stem.split('_')[1]) if self.segments else 0
+        self.total_bytes = sum(path.stat().st_size for path in self.segments)
+    
+    def _open_segment(self):
+        self.segment_number += 1
+        path = self.directory / f"segment_{self.segment_number:06d}.bin"
+        path.touch()
+        self.segments.append(path)
+    
+    def append(self, serial, kind, name, data, digest):
+        codec = 'zlib' if kind == 'xml' else 'raw'
+        payload = zlib.compress(data, 6) if codec == 'zlib' else data
+        
+        with self.lock:
+            if not self.segments:
+                self._open_segment()
+            segment = self.segments[-1]
+            offset = segment.stat().st_size
+            if offset and offset + len(payload) > self.segment_bytes:
+                self._open_segment()
+                segment, offset = self.segments[-1], 0
+            with open(segment, 'ab') as f:
+                f.write(payload)
+            entry = {'segment': segment.name, 'offset': offset, 'length': len(payload), 'codec': codec,
+                     'serial': serial, 'kind': kind, 'name': name, 'hash': digest, 'time': time.time()}
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.total_bytes += len(payload)
+            
+            while self.total_bytes > self.budget_bytes and len(self.segments) > 1:
+                self._evict_oldest()
+    
+    def _evict_oldest(self):
+        oldest = self.segments.pop(0)
+        self.total_bytes -= oldest.stat().st_size
+        kept = [line for line in self.index_path.read_text(encoding='utf-8').splitlines()
+                if json.loads(line)['segment'] != oldest.name]
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(''.join(line + '\n' for line in kept), encoding='utf-8')
+        os.replace(tmp_path, self.index_path)
+        oldest.unlink()
+        print(f"[INFO] Frame log over budget, evicted {oldest.name}")
+    
+    def entries(self):
+        if not self.index_path.exists():
+            return []
+        return [json.loads(line) for line in self.index_path.read_text(encoding='utf-8').splitlines()]
+    
+    def read(self, entry):
+        with open(self.directory / entry['segment'], 'rb') as f:
+            f.seek(entry['offset'])
+            payload = f.read(entry['length'])
+        return zlib.decompress(payload) if entry['codec'] == 'zlib' else payload
+    
+    def extract(self, output_dir):
+        """Write every logged frame back out as a normal .png/.xml file"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        entries = self.entries()
+        for entry in entries:
+            extension = 'png' if entry['kind'] == 'screenshot' else 'xml'
+            (output_dir / f"{entry['name']}.{extension}").write_bytes(self.read(entry))
+        return len(entries)
+
 
 class EmulatorMonitor:
-    def __init__(self, serial, output_dir):
+    def __init__(self, serial, output_dir, dedup='link', frame_log=None):
         self.serial = serial
         self.output_dir = Path(output_dir)
         self.screenshot_dir = self.output_dir / "screenshots"
         self.xml_dir = self.output_dir / "xml_dumps"
         self.parsed_dir = self.output_dir / "parsed_xml"
+        # None until the first dump shows whether exec-out to /dev/tty works here
+        self.tty_dump = None
+        # Unchanged frames: 'link' hard-links the previous file, 'skip' writes nothing
+        self.dedup = dedup
+        # When set, frames go to this FrameLog instead of individual files
+        self.frame_log = frame_log
+        # kind -> (hash, path) of the last frame written
+        self.last_frames = {}
+        self.last_parsed = None
+        # (xml path, node table) of the last dump, shared by rendering and search
+        self.last_table = (None, None)
         
         # Create directories
         for dir_path in [self.screenshot_dir, self.xml_dir, self.parsed_dir]:
@@ -53,25 +201,113 @@ class EmulatorMonitor:
             )
             
             if result.returncode == 0 and len(result.stdout) > 0:
-                with open(path, 'wb') as f:
-                    f.write(result.stdout)
-                print(f"[INFO] Screenshot: {path}")
-                return path
+                saved, changed = self.save_frame('screenshot', path, result.stdout)
+                print(f"[INFO] Screenshot: {saved or 'frame log'}{'' if changed else ' (unchanged)'}")
+                return saved
         except Exception as e:
             print(f"[ERROR] Screenshot failed: {e}")
         
         return None
     
+    def save_frame(self, kind, path, data):
+        """Store a captured frame unless it matches the previous one of its kind
+        
+        screencap and uiautomator output is byte-for-byte identical while the
+        screen doesn't change, so a hash of the raw bytes is enough to spot
+        repeats. Returns (path or None, changed).
+        """
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        last_digest, last_path = self.last_frames.get(kind, (None, None))
+        changed = digest != last_digest or self.dedup == 'off'
+        
+        if self.frame_log:
+            if changed:
+                self.frame_log.append(self.serial, kind, path.stem, data, digest)
+            self.last_frames[kind] = (digest, None)
+            return None, changed
+        
+        if not changed:
+            if self.dedup == 'skip':
+                return last_path, False
+            try:
+                os.link(last_path, path)
+                return path, False
+            except OSError:
+                pass  # e.g. no hard links on this filesystem - write a copy instead
+        
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.last_frames[kind] = (digest, path)
+        return path, changed
+    
+    def dump_xml_tty(self):
+        """Dump UI hierarchy straight to stdout - one adb call, no file on the device"""
+        try:
+            result = subprocess.run(
+                ['adb', '-s', self.serial, 'exec-out', 'uiautomator', 'dump', '/dev/tty'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=10
+            )
+        except subprocess.TimeoutExpired:
+            print(f"[ERROR] ADB command timeout: exec-out uiautomator dump on {self.serial}")
+            return None
+        
+        # uiautomator appends "UI hierchary dumped to: /dev/tty" after the XML
+        end = result.stdout.rfind(b'</hierarchy>')
+        if result.returncode != 0 or end < 0:
+            return None
+        return result.stdout[:end + len(b'</hierarchy>')]
+    
     def capture_xml(self, filename):
         """Capture UI hierarchy XML"""
+        local_xml = self.xml_dir / f"{self.serial}_{filename}.xml"
+        
+        xml_bytes = None
+        if self.tty_dump is not False:
+            xml_bytes = self.dump_xml_tty()
+            if self.tty_dump is None:
+                self.tty_dump = xml_bytes is not None
+                if not self.tty_dump:
+                    print(f"[INFO] {self.serial}: uiautomator can't dump to /dev/tty, using dump/pull")
+        if xml_bytes is None:
+            xml_bytes = self.dump_xml_pull()
+        if xml_bytes is None:
+            return None
+        
+        saved, changed = self.save_frame('xml', local_xml, xml_bytes)
+        print(f"[INFO] XML dump: {saved or 'frame log'}{'' if changed else ' (unchanged)'}")
+        
+        # The parsed text can always be regenerated from the XML, so the
+        # frame log doesn't keep it
+        if changed and not self.frame_log:
+            try:
+                nodes = parse_node_table(io.BytesIO(xml_bytes))
+                self.last_table = (str(saved), nodes)
+                self.last_parsed = self.parse_xml_to_text(saved, filename, nodes)
+            except Exception as e:
+                print(f"[ERROR] XML parsing failed: {e}")
+        elif not changed and self.dedup == 'link' and self.last_parsed:
+            try:
+                os.link(self.last_parsed, self.parsed_dir / f"{self.serial}_{filename}_parsed.txt")
+            except OSError:
+                pass
+        
+        return saved
+    
+    def dump_xml_pull(self):
+        """Dump UI hierarchy via a file on the device (older uiautomator)"""
         timestamp = int(time.time())
         xml_path = f"/sdcard/ui_dump_{timestamp}.xml"
-        local_xml = self.xml_dir / f"{self.serial}_{filename}.xml"
+        local_xml = self.xml_dir / f".{self.serial}_pull.xml"
         
         try:
-            # Dump UI hierarchy
-            self.run_adb(f"shell uiautomator dump {xml_path}")
-            time.sleep(0.5)
+            # Dump UI hierarchy - adb returns once uiautomator has written the
+            # file and reports where, so no settle delay is needed
+            output = self.run_adb(f"shell uiautomator dump {xml_path}")
+            if "dumped to" not in output:
+                print(f"[ERROR] UI dump failed on {self.serial}: {output or 'no output'}")
+                return None
             
             # Pull XML file
             result = subprocess.run(
@@ -83,85 +319,63 @@ class EmulatorMonitor:
             # Clean up remote file
             self.run_adb(f"shell rm {xml_path}")
             
-            if local_xml.exists():
-                print(f"[INFO] XML dump: {local_xml}")
-                
-                # Parse XML
-                self.parse_xml_to_text(local_xml, filename)
-                
-                return local_xml
+            if result.returncode == 0 and local_xml.exists():
+                xml_bytes = local_xml.read_bytes()
+                local_xml.unlink()
+                return xml_bytes
         except Exception as e:
             print(f"[ERROR] XML capture failed: {e}")
         
         return None
     
-    def parse_xml_to_text(self, xml_path, filename):
+    def node_table(self, xml_path):
+        """Node table for a dump file, reusing the one built at capture time"""
+        cached_path, nodes = self.last_table
+        if cached_path != str(xml_path):
+            nodes = parse_node_table(xml_path)
+            self.last_table = (str(xml_path), nodes)
+        return nodes
+    
+    def parse_xml_to_text(self, xml_path, filename, nodes=None):
         """Parse XML to readable text format"""
         parsed_path = self.parsed_dir / f"{self.serial}_{filename}_parsed.txt"
         
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            
-            output = []
-            output.append("=" * 80)
-            output.append(f"UI Hierarchy - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            output.append("=" * 80)
-            output.append("")
-            
-            def process_node(node, depth=0):
-                indent = "  " * depth
-                attrs = []
-                
-                # Extract attributes
-                text = node.get('text', '')
-                resource_id = node.get('resource-id', '')
-                content_desc = node.get('content-desc', '')
-                class_name = node.get('class', '')
-                bounds = node.get('bounds', '')
-                clickable = node.get('clickable', 'false')
-                checkable = node.get('checkable', 'false')
-                
-                if text:
-                    attrs.append(f"text='{text}'")
-                if resource_id:
-                    attrs.append(f"id='{resource_id}'")
-                if content_desc:
-                    attrs.append(f"desc='{content_desc}'")
-                if class_name:
-                    attrs.append(f"class='{class_name}'")
-                if bounds:
-                    attrs.append(f"bounds='{bounds}'")
-                    # Extract center coordinates
-                    match = re.match(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', bounds)
-                    if match:
-                        x1, y1, x2, y2 = map(int, match.groups())
-                        center_x = (x1 + x2) // 2
-                        center_y = (y1 + y2) // 2
-                        attrs.append(f"center=({center_x}, {center_y})")
-                
-                if clickable == 'true':
-                    attrs.append("[CLICKABLE]")
-                if checkable == 'true':
-                    attrs.append("[CHECKABLE]")
-                
-                line = f"{indent}<{class_name}"
-                if attrs:
-                    line += " " + " ".join(attrs)
-                line += ">"
-                output.append(line)
-                
-                if text:
-                    output.append(f"{indent}  Text: {text}")
-                
-                # Process children
-                for child in node:
-                    process_node(child, depth + 1)
-            
-            process_node(root)
+            if nodes is None:
+                nodes = self.node_table(xml_path)
             
             with open(parsed_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(output))
+                f.write("=" * 80 + "\n")
+                f.write(f"UI Hierarchy - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write("=" * 80 + "\n")
+                
+                for node in nodes:
+                    indent = "  " * node.depth
+                    attrs = []
+                    
+                    if node.text:
+                        attrs.append(f"text='{node.text}'")
+                    if node.resource_id:
+                        attrs.append(f"id='{node.resource_id}'")
+                    if node.content_desc:
+                        attrs.append(f"desc='{node.content_desc}'")
+                    if node.class_name:
+                        attrs.append(f"class='{node.class_name}'")
+                    if node.bounds:
+                        attrs.append(f"bounds='{node.bounds}'")
+                        if node.center:
+                            attrs.append(f"center=({node.center[0]}, {node.center[1]})")
+                    
+                    if node.clickable == 'true':
+                        attrs.append("[CLICKABLE]")
+                    if node.checkable == 'true':
+                        attrs.append("[CHECKABLE]")
+                    
+                    # Lines are newline-separated with none after the last one
+                    f.write(f"\n{indent}<{node.class_name}{' ' if attrs else ''}{' '.join(attrs)}>")
+                    
+                    if node.text:
+                        f.write(f"\n{indent}  Text: {node.text}")
             
             print(f"[INFO] Parsed XML: {parsed_path}")
             return parsed_path
@@ -175,41 +389,19 @@ class EmulatorMonitor:
         results = []
         
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            
-            def search_node(node):
-                text = node.get('text', '')
-                resource_id = node.get('resource-id', '')
-                bounds = node.get('bounds', '')
-                
-                match = False
-                if search_text and search_text.lower() in text.lower():
-                    match = True
-                if search_id and search_id in resource_id:
-                    match = True
-                
-                if match:
+            search_lower = search_text.lower() if search_text else None
+            for node in self.node_table(xml_path):
+                if ((search_lower and search_lower in node.text_lower) or
+                        (search_id and search_id in node.resource_id)):
                     info = {
-                        'text': text,
-                        'resource_id': resource_id,
-                        'bounds': bounds,
-                        'clickable': node.get('clickable', 'false')
+                        'text': node.text,
+                        'resource_id': node.resource_id,
+                        'bounds': node.bounds,
+                        'clickable': node.clickable
                     }
-                    
-                    # Extract center coordinates
-                    match_coords = re.match(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]', bounds)
-                    if match_coords:
-                        x1, y1, x2, y2 = map(int, match_coords.groups())
-                        info['center_x'] = (x1 + x2) // 2
-                        info['center_y'] = (y1 + y2) // 2
-                    
+                    if node.center:
+                        info['center_x'], info['center_y'] = node.center
                     results.append(info)
-                
-                for child in node:
-                    search_node(child)
-            
-            search_node(root)
             
         except Exception as e:
             print(f"[ERROR] Element search failed: {e}")
@@ -217,6 +409,65 @@ class EmulatorMonitor:
         return results
 
 
+class RoundTimer:
+    """Wall-clock stats for capture rounds, checked against the capture interval"""
+    
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.durations = []
+        self.overruns = 0
+    
+    def record(self, duration, device_times):
+        self.durations.append(duration)
+        if self.interval and duration > self.interval:
+            self.overruns += 1
+        
+        slowest = max(device_times, key=device_times.get) if device_times else None
+        line = f"[TIMING] Round {len(self.durations)}: {duration:.2f}s"
+        if slowest:
+            line += f" (slowest {slowest}: {device_times[slowest]:.2f}s)"
+        if self.interval:
+            line += f", {self.overruns}/{len(self.durations)} over the {self.interval}s interval"
+        print(line)
+    
+    def summary(self):
+        if not self.durations:
+            return
+        ordered = sorted(self.durations)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"[TIMING] {len(ordered)} rounds: min {ordered[0]:.2f}s, "
+              f"avg {sum(ordered) / len(ordered):.2f}s, p95 {p95:.2f}s, max {ordered[-1]:.2f}s")
+        if self.interval:
+            print(f"[TIMING] {self.overruns} round(s) took longer than the {self.interval}s interval")
+
+
+def capture_round(monitors, filename, executor, screenshots=True, xml=True):
+    """Capture from every emulator at once; returns seconds each device took.
+    
+    Screenshot and XML capture are separate jobs, so each device's screencap
+    overlaps its uiautomator dump as well as the other devices' captures.
+    """
+    started = time.perf_counter()
+    
+    def timed(capture):
+        capture(filename)
+        return time.perf_counter()
+    
+    jobs = []
+    for monitor in monitors:
+        print(f"[INFO] Capturing from {monitor.serial}...")
+        if screenshots:
+            jobs.append((monitor.serial, executor.submit(timed, monitor.capture_screenshot)))
+        if xml:
+            jobs.append((monitor.serial, executor.submit(timed, monitor.capture_xml)))
+    
+    # A device is done when its last job is; each job reports when it finished
+    device_times = {}
+    for serial, job in jobs:
+        device_times[serial] = max(device_times.get(serial, 0.0), job.result() - started)
+    return device_times
+
+
 def get_emulator_list():
     """Get list of connected emulators"""
     try:
@@ -241,6 +492,17 @@ def main():
     parser.add_argument('-c', '--continuous', action='store_true', help='Continuous monitoring mode')
     parser.add_argument('--xml-only', action='store_true', help='Capture XML only')
     parser.add_argument('--screenshot-only', action='store_true', help='Capture screenshots only')
+    parser.add_argument('--dedup', choices=DEDUP_MODES, default='link',
+                        help="Unchanged frames: hard-link the previous file (link), don't save them (skip), "
+                             "or save every frame in full (off)")
+    parser.add_argument('--frame-log', action='store_true',
+                        help='Store changed frames in a compressed frame log instead of separate files')
+    parser.add_argument('--max-disk-mb', type=float, default=1024,
+                        help='Frame log disk budget; the oldest frames are evicted beyond it')
+    parser.add_argument('--extract-frames', metavar='LOG_DIR',
+                        help='Write the frames in a frame log out as .png/.xml files to --output and exit')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Parallel capture jobs (default: two per emulator)')
     
     args = parser.parse_args()
     
@@ -255,6 +517,11 @@ def main():
     print("=" * 60)
     print()
     
+    if args.extract_frames:
+        count = FrameLog(args.extract_frames, 0).extract(output_dir)
+        print(f"[SUCCESS] Extracted {count} frame(s) to {output_dir.absolute()}")
+        return
+    
     # Get emulators
     if args.serials:
         emulator_serials = args.serials
@@ -276,18 +543,21 @@ def main():
     print()
     
     # Create monitors
-    monitors = [EmulatorMonitor(serial, output_dir) for serial in emulator_serials]
+    frame_log = FrameLog(output_dir / "frame_log", int(args.max_disk_mb * (1 << 20))) if args.frame_log else None
+    monitors = [EmulatorMonitor(serial, output_dir, args.dedup, frame_log) for serial in emulator_serials]
+    executor = ThreadPoolExecutor(max_workers=args.workers or 2 * len(monitors))
+    timer = RoundTimer(args.interval if args.continuous else None)
     
     def capture_all(suffix=""):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"{timestamp}_{suffix}" if suffix else timestamp
         
-        for monitor in monitors:
-            print(f"[INFO] Capturing from {monitor.serial}...")
-            if not args.xml_only:
-                monitor.capture_screenshot(filename)
-            if not args.screenshot_only:
-                monitor.capture_xml(filename)
+        started = time.perf_counter()
+        device_times = capture_round(monitors, filename, executor,
+                                     screenshots=not args.xml_only, xml=not args.screenshot_only)
+        duration = time.perf_counter() - started
+        timer.record(duration, device_times)
+        return duration
     
     if args.continuous:
         print(f"[INFO] Continuous mode: Capturing every {args.interval} seconds")
@@ -299,8 +569,9 @@ def main():
             while True:
                 counter += 1
                 print(f"\n[Capture #{counter}] {datetime.now().strftime('%H:%M:%S')}")
-                capture_all(f"auto_{counter}")
-                time.sleep(args.interval)
+                duration = capture_all(f"auto_{counter}")
+                # Keep a steady cadence: the interval runs from the start of each round
+                time.sleep(max(0, args.interval - duration))
         except KeyboardInterrupt:
             print("\n[INFO] Monitoring stopped.")
     else:
@@ -322,11 +593,12 @@ def main():
             except KeyboardInterrupt:
                 break
     
+    executor.shutdown(wait=True)
+    timer.summary()
     print(f"\n[SUCCESS] Monitoring complete. Files saved in: {output_dir.absolute()}")
 
 
 if __name__ == "__main__":
-    import re
     main()
 
 
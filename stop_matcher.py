@@ -0,0 +1,338 @@
+"""
+Offline shuttle stop and route matcher.
+
+Recomputes what POST /api/shuttle/match-route does, for many requests at
+once: find the stops within the search radius of the start and the end,
+then the route and stop pair with start order < end order that needs the
+least walking. Stops go into a uniform grid index on a local metric
+projection. Distances are vectorized haversine over NumPy arrays.
+
+The server additionally ranks routes by their next schedule; that depends
+on the clock, so offline matching ranks by walking distance only.
+
+Usage:
+    python stop_matcher.py network.json --start 30.046 31.23 --end 30.105 31.36
+    python stop_matcher.py stops.csv --route-stops route_stops.csv --check requests.jsonl
+"""
+
+import argparse
+import csv
+import json
+
+import numpy as np
+
+from visualize_route import read_request_log, response_matches
+
+EARTH_RADIUS_M = 6371000.0
+DEFAULT_RADIUS_M = 1000.0  # same search radius as ShuttleController::matchRoute
+CHUNK_SIZE = 50_000        # requests matched per vectorized block
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters; arguments broadcast like NumPy arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ShuttleNetwork:
+    """Stops as parallel arrays plus each route's stops in pivot order"""
+
+    def __init__(self, stops, route_stops, route_names=None):
+        """stops: [(id, name, lat, lng)]; route_stops: [(route_id, stop_id, order)]"""
+        self.stop_ids = np.array([stop[0] for stop in stops], dtype=np.int64)
+        self.stop_names = [stop[1] for stop in stops]
+        # Exports carry coordinates as strings; parse them once here
+        self.lat = np.array([float(stop[2]) for stop in stops], dtype=np.float64)
+        self.lng = np.array([float(stop[3]) for stop in stops], dtype=np.float64)
+        position = {stop_id: i for i, stop_id in enumerate(self.stop_ids.tolist())}
+
+        by_route = {}
+        for route_id, stop_id, order in route_stops:
+            if stop_id in position:
+                by_route.setdefault(route_id, []).append((order, position[stop_id]))
+        self.route_ids = sorted(by_route)
+        self.route_names = [(route_names or {}).get(route_id, str(route_id)) for route_id in self.route_ids]
+        # Stop positions along each route, in pivot order
+        self.route_stops = [np.array([i for _, i in sorted(by_route[route_id])], dtype=np.int64)
+                            for route_id in self.route_ids]
+
+    def __len__(self):
+        return len(self.stop_ids)
+
+
+def load_network(path, route_stops_path=None):
+    """Load stops and route_stops from a JSON or CSV export
+
+    JSON may be {"stops": [...], "route_stops": [...]} as exported from the
+    tables, or routes with nested stops carrying pivot.order, as returned by
+    /api/shuttle/routes or in matched_routes (a bare list, or under "routes",
+    "matched_routes" or "data"). CSV is the stops table, with the
+    route_stops table (route_id, stop_id, order) passed separately.
+    """
+    route_names = {}
+    if path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            stops = [(int(row["id"]), row["name"], row["latitude"], row["longitude"]) for row in csv.DictReader(f)]
+        if not route_stops_path:
+            raise ValueError("A CSV stops export needs --route-stops")
+        with open(route_stops_path, "r", encoding="utf-8", newline="") as f:
+            route_stops = [(int(row["route_id"]), int(row["stop_id"]), int(row["order"]))
+                           for row in csv.DictReader(f)]
+        return ShuttleNetwork(stops, route_stops)
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if isinstance(data, dict) and "stops" in data and "route_stops" in data:
+        stops = [(int(s["id"]), s["name"], s["latitude"], s["longitude"]) for s in data["stops"]]
+        route_stops = [(int(rs["route_id"]), int(rs["stop_id"]), int(rs["order"])) for rs in data["route_stops"]]
+        route_names = {int(r["id"]): r["name"] for r in data.get("routes", [])}
+        return ShuttleNetwork(stops, route_stops, route_names)
+
+    routes = data
+    if isinstance(data, dict):
+        routes = data.get("routes") or data.get("matched_routes") or data.get("data") or []
+    stops, route_stops = {}, []
+    for route in routes:
+        route_names[int(route["id"])] = route["name"]
+        for stop in route["stops"]:
+            stops[int(stop["id"])] = (int(stop["id"]), stop["name"], stop["latitude"], stop["longitude"])
+            route_stops.append((int(route["id"]), int(stop["id"]), int(stop["pivot"]["order"])))
+    return ShuttleNetwork(list(stops.values()), route_stops, route_names)
+
+
+class StopIndex:
+    """Uniform grid over stops for radius queries
+
+    Coordinates are projected to meters around the stops' mean latitude
+    (accurate to well under 1% across a city) and bucketed into square
+    cells one radius wide, so every stop within the radius of a point lies
+    in the 3x3 cells around it. Exact haversine distances are computed only
+    for the stops in those cells.
+    """
+
+    def __init__(self, network, radius=DEFAULT_RADIUS_M):
+        self.network = network
+        self.radius = radius
+        self.cos_lat = np.cos(np.radians(network.lat.mean())) if len(network) else 1.0
+        # A little wider than the radius to absorb the projection error
+        self.cell_m = radius * 1.02
+
+        cx, cy = self._cells(network.lat, network.lng)
+        keys = self._keys(cx, cy)
+        self.order = np.argsort(keys, kind="stable")
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(
+            keys[self.order], return_index=True, return_counts=True)
+        self.max_per_cell = int(self.cell_counts.max()) if len(self.cell_counts) else 0
+
+    def _cells(self, lat, lng):
+        x = np.radians(np.asarray(lng, dtype=np.float64)) * EARTH_RADIUS_M * self.cos_lat
+        y = np.radians(np.asarray(lat, dtype=np.float64)) * EARTH_RADIUS_M
+        return np.floor(x / self.cell_m).astype(np.int64), np.floor(y / self.cell_m).astype(np.int64)
+
+    @staticmethod
+    def _keys(cx, cy):
+        # Cells are ~1km, so grid coordinates stay far inside 32 bits
+        return (cx << 32) + (cy & 0xFFFFFFFF)
+
+    def pairs_within(self, lat, lng, radius=None):
+        """All (query index, stop position, distance) with the stop within radius of the query"""
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            raise ValueError(f"Index was built for radius {self.radius}m, asked for {radius}m")
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        cx, cy = self._cells(lat, lng)
+        queries, stops, distances = [], [], []
+        if not self.max_per_cell:
+            return np.array([], np.int64), np.array([], np.int64), np.array([], np.float64)
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._keys(cx + dx, cy + dy)
+                slot = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+                found = self.cell_keys[slot] == keys
+                query = np.nonzero(found)[0]
+                start, count = self.cell_starts[slot[query]], self.cell_counts[slot[query]]
+                # One vectorized step per stop slot in the fullest cell
+                for j in range(self.max_per_cell):
+                    has = count > j
+                    if not has.any():
+                        break
+                    q = query[has]
+                    stop = self.order[start[has] + j]
+                    d = haversine(lat[q], lng[q], self.network.lat[stop], self.network.lng[stop])
+                    keep = d <= radius
+                    queries.append(q[keep])
+                    stops.append(stop[keep])
+                    distances.append(d[keep])
+        return np.concatenate(queries), np.concatenate(stops), np.concatenate(distances)
+
+    def nearest(self, lat, lng, radius=None, chunk_size=CHUNK_SIZE):
+        """Nearest stop within radius of each point: (stop positions, distances), -1/inf if none"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        best_stop = np.full(len(lat), -1, dtype=np.int64)
+        best_distance = np.full(len(lat), np.inf)
+        for lo in range(0, len(lat), chunk_size):
+            queries, stops, distances = self.pairs_within(lat[lo:lo + chunk_size], lng[lo:lo + chunk_size], radius)
+            # Distances are at most the radius, so this orders by query, then distance
+            order = np.argsort(queries * (2.0 * self.radius) + distances)
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = queries[order][1:] != queries[order][:-1]
+            pick = order[first]
+            best_stop[lo + queries[pick]] = stops[pick]
+            best_distance[lo + queries[pick]] = distances[pick]
+        return best_stop, best_distance
+
+
+def match_routes(index, start_lat, start_lng, end_lat, end_lng, radius=None, chunk_size=CHUNK_SIZE):
+    """Best route for each request, as the server picks it minus schedules
+
+    For every route, the boarding stop must come before the alighting stop
+    and both must be within radius; among those pairs the one with the
+    least total walking wins, and then the route with the least walking.
+    Ties go to the lowest route.
+
+    Rather than scoring every route for every request, the nearby
+    (request, stop) pairs are expanded to (request, route, position) and
+    boarding and alighting candidates are joined on (request, route), so
+    the work grows with the number of nearby candidates only.
+
+    Returns (route, start stop, end stop, walking meters) arrays holding
+    positions into network.route_ids / network.stop_ids; -1 and inf where
+    no route matches.
+    """
+    network = index.network
+    start_lat, start_lng, end_lat, end_lng = (np.atleast_1d(np.asarray(a, dtype=np.float64))
+                                              for a in (start_lat, start_lng, end_lat, end_lng))
+    total = len(start_lat)
+    best_route = np.full(total, -1, dtype=np.int64)
+    best_start = np.full(total, -1, dtype=np.int64)
+    best_end = np.full(total, -1, dtype=np.int64)
+    best_walk = np.full(total, np.inf)
+
+    # Every (route, position) a stop appears at, grouped by stop
+    slot_stop = np.concatenate([stops for stops in network.route_stops] + [np.array([], np.int64)])
+    slot_route = np.repeat(np.arange(len(network.route_stops)), [len(stops) for stops in network.route_stops])
+    slot_position = np.concatenate([np.arange(len(stops)) for stops in network.route_stops] + [np.array([], np.int64)])
+    by_stop = np.argsort(slot_stop, kind="stable")
+    slots_per_stop = np.bincount(slot_stop, minlength=len(network))
+    first_slot = np.concatenate(([0], np.cumsum(slots_per_stop)[:-1]))
+
+    def expand(queries, stops, distances):
+        """(request, stop) pairs -> (request, route, position, stop, distance) for every route slot"""
+        counts = slots_per_stop[stops]
+        pair = np.repeat(np.arange(len(stops)), counts)
+        within = np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+        slot = by_stop[first_slot[stops[pair]] + within]
+        return queries[pair], slot_route[slot], slot_position[slot], stops[pair], distances[pair]
+
+    routes = max(len(network.route_stops), 1)
+    for lo in range(0, total, chunk_size):
+        hi = min(lo + chunk_size, total)
+        b_query, b_route, b_position, b_stop, b_distance = expand(
+            *index.pairs_within(start_lat[lo:hi], start_lng[lo:hi], radius))
+        a_query, a_route, a_position, a_stop, a_distance = expand(
+            *index.pairs_within(end_lat[lo:hi], end_lng[lo:hi], radius))
+
+        # Join boarding and alighting candidates on (request, route)
+        a_key = a_query * routes + a_route
+        a_order = np.argsort(a_key, kind="stable")
+        a_key = a_key[a_order]
+        b_key = b_query * routes + b_route
+        first = np.searchsorted(a_key, b_key, side="left")
+        counts = np.searchsorted(a_key, b_key, side="right") - first
+        b = np.repeat(np.arange(len(b_key)), counts)
+        a = a_order[np.repeat(first, counts) + np.arange(len(b)) - np.repeat(np.cumsum(counts) - counts, counts)]
+
+        valid = (b_position[b] < a_position[a]) & (b_stop[b] != a_stop[a])
+        b, a = b[valid], a[valid]
+        query = b_query[b]
+        walk = b_distance[b] + a_distance[a]
+
+        # Least walking per request in one sort: walks are below 2 * radius,
+        # so query * 4 * radius + walk orders by request, then walk. The sort
+        # is stable and candidates come out of the join by route, so ties go
+        # to the lowest route.
+        order = np.argsort(query * (4.0 * index.radius) + walk, kind="stable")
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = query[order][1:] != query[order][:-1]
+        pick = order[keep]
+        rows = lo + query[pick]
+        best_route[rows] = b_route[b[pick]]
+        best_start[rows] = b_stop[b[pick]]
+        best_end[rows] = a_stop[a[pick]]
+        best_walk[rows] = walk[pick]
+
+    return best_route, best_start, best_end, best_walk
+
+
+def check_log(index, log_path, radius=None):
+    """Compare logged server matches with a local recomputation"""
+    network = index.network
+    requests, served = [], []
+    for request, response in read_request_log(log_path):
+        if "start_lat" not in request:
+            continue
+        # The server's pick is the best (first) match
+        _, start_stop, end_stop = (response_matches(response) or [(None, None, None)])[0]
+        served.append((int(start_stop["id"]), int(end_stop["id"])) if start_stop and end_stop else None)
+        requests.append((request["start_lat"], request["start_lng"], request["end_lat"], request["end_lng"]))
+
+    if not requests:
+        print(f"No requests in {log_path}")
+        return
+    coords = np.array(requests, dtype=np.float64)
+    _, start, end, _ = match_routes(index, *coords.T, radius=radius)
+
+    agree = server_only = local_only = differ = 0
+    for served_pair, s, e in zip(served, start.tolist(), end.tolist()):
+        local_pair = (int(network.stop_ids[s]), int(network.stop_ids[e])) if s >= 0 else None
+        if served_pair == local_pair:
+            agree += 1
+        elif local_pair is None:
+            server_only += 1
+        elif served_pair is None:
+            local_only += 1
+        else:
+            differ += 1
+    print(f"{len(requests)} requests: {agree} agree, {differ} picked different stops, "
+          f"{server_only} matched only by the server, {local_only} matched only locally")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline shuttle stop and route matching")
+    parser.add_argument("network", help="Stops/routes export (.json, or stops .csv with --route-stops)")
+    parser.add_argument("--route-stops", help="route_stops CSV (route_id, stop_id, order)")
+    parser.add_argument("--radius", type=float, default=DEFAULT_RADIUS_M, help="Search radius in meters")
+    parser.add_argument("--start", type=float, nargs=2, metavar=("LAT", "LNG"))
+    parser.add_argument("--end", type=float, nargs=2, metavar=("LAT", "LNG"))
+    parser.add_argument("--check", metavar="LOG", help="JSONL request/response log to recompute and compare")
+    args = parser.parse_args()
+
+    network = load_network(args.network, args.route_stops)
+    index = StopIndex(network, args.radius)
+    print(f"Loaded {len(network)} stops on {len(network.route_ids)} routes")
+
+    if args.check:
+        check_log(index, args.check)
+    if args.start:
+        for label, point in (("start", args.start), ("end", args.end or args.start)):
+            stop, distance = index.nearest(*point)
+            if stop[0] >= 0:
+                print(f"Nearest stop to {label}: {network.stop_names[stop[0]]} ({distance[0]:.0f} m)")
+            else:
+                print(f"No stop within {args.radius:.0f} m of {label}")
+    if args.start and args.end:
+        route, start, end, walk = match_routes(index, *args.start, *args.end)
+        if route[0] >= 0:
+            print(f"Best route: {network.route_names[route[0]]}: board at {network.stop_names[start[0]]}, "
+                  f"alight at {network.stop_names[end[0]]}, {walk[0]:.0f} m walking")
+        else:
+            print("No valid route connects these locations")
+
+
+if __name__ == "__main__":
+    main()
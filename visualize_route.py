@@ -1,5 +1,33 @@
-import folium
+"""
+Plot shuttle match-route results on a Leaflet map.
+
+With no arguments, renders the sample request/response below to
+shuttle_route_map.html. With --batch, renders every matched route from a
+JSONL log of logged requests on one map.
+
+--format geojson or binary skips folium entirely: the stops, routes and
+request points are written once as compact data, next to a small static
+viewer page (route_viewer.html) that draws them in the browser. Browsers
+don't let pages read local files, so serve the directory, e.g. with
+python -m http.server, and open route_viewer.html from there.
+
+Routes are drawn along their road geometry when the log has it (the
+encoded "polyline" GoogleMapsService returns, or a "geometry" list of
+[lat, lng] points), otherwise through their stops. Lines are simplified
+with Douglas-Peucker (--simplify dp) or Visvalingam-Whyatt (vw) into one
+detail level per zoom range in LOD_LEVELS, and the map only shows the
+level for the current zoom. --tolerance is the allowed error in meters at
+zoom 16, where the default of 2 m is about a pixel.
+
+Usage: python visualize_route.py [--batch requests.jsonl] [--format html|geojson|binary]
+                                 [--simplify dp|vw|none] [--tolerance 2] [-o OUTPUT]
+"""
+
+import argparse
 import json
+import os
+
+import numpy as np
 
 # Data from the API response and user request
 request_data = {
@@ -54,86 +82,714 @@ api_response = {
     ]
 }
 
-# Create a map centered between start and end points
-center_lat = (request_data["start_lat"] + request_data["end_lat"]) / 2
-center_lng = (request_data["start_lng"] + request_data["end_lng"]) / 2
-m = folium.Map(location=[center_lat, center_lng], zoom_start=13)
-
-# 1. Plot User Requested Start/End Points (Blue Markers)
-folium.Marker(
-    [request_data["start_lat"], request_data["start_lng"]],
-    popup="User Start Location",
-    icon=folium.Icon(color="blue", icon="user")
-).add_to(m)
-
-folium.Marker(
-    [request_data["end_lat"], request_data["end_lng"]],
-    popup="User Destination",
-    icon=folium.Icon(color="blue", icon="flag")
-).add_to(m)
-
-# 2. Plot Matched Route
-route = api_response["matched_routes"][0]
-route_coordinates = []
-
-for stop in route["stops"]:
-    lat = float(stop["latitude"])
-    lng = float(stop["longitude"])
-    route_coordinates.append([lat, lng])
-    
-    # Color code stops: Green for pickup, Red for dropoff, Gray for others
-    color = "gray"
-    icon = "info-sign"
-    popup_text = f"{stop['name']} (Order: {stop['pivot']['order']})"
-    
-    if stop["id"] == api_response["start_stop"]["id"]:
-        color = "green"
-        icon = "play"
-        popup_text = f"PICKUP: {stop['name']}"
-    elif stop["id"] == api_response["end_stop"]["id"]:
-        color = "red"
-        icon = "stop"
-        popup_text = f"DROPOFF: {stop['name']}"
-        
+OUTPUT_FILE = "shuttle_route_map.html"
+BATCH_OUTPUT_FILE = "shuttle_batch_map.html"
+OUTPUT_EXTENSIONS = {"html": ".html", "geojson": ".geojson", "binary": ".bin"}
+VIEWER_FILE = "route_viewer.html"
+BINARY_MAGIC = b"SRPK"
+BINARY_VERSION = 2
+EARTH_RADIUS_M = 6371000
+DEFAULT_TOLERANCE_M = 2.0
+# (min zoom, max zoom, tolerance multiple). Each zoom level out doubles the
+# meters per pixel, so a level's tolerance is --tolerance * 2 ** (16 - max
+# zoom): about a pixel at its most detailed zoom, less below that.
+LOD_LEVELS = [(0, 11, 32), (12, 13, 8), (14, 15, 2), (16, 30, 1)]
+
+
+def decode_polyline(encoded):
+    """Decode a Google encoded polyline into an (n, 2) array of lat/lng
+
+    Each value is a zigzag-encoded delta split into 5-bit chunks, offset by
+    63, with 0x20 set on every chunk but the last. Chunks are shifted into
+    place and summed per value with reduceat, then the deltas are summed.
+    """
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if not len(chunks):
+        return np.zeros((0, 2))
+    last = chunks < 0x20
+    starts = np.flatnonzero(np.r_[True, last[:-1]])
+    value_of = np.r_[0, np.cumsum(last[:-1])]
+    shift = 5 * (np.arange(len(chunks)) - starts[value_of])
+    values = np.add.reduceat((chunks & 0x1f) << shift, starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 1e5
+
+
+def route_geometry(route):
+    """Road geometry of a logged route as an (n, 2) lat/lng array, or None
+
+    Takes an encoded "polyline", at the top level or under
+    "directions_data" as the rides API returns it, or a "geometry" list of
+    [lat, lng] points.
+    """
+    encoded = route.get("polyline") or (route.get("directions_data") or {}).get("polyline")
+    if encoded:
+        return decode_polyline(encoded)
+    if route.get("geometry"):
+        return np.asarray(route["geometry"], dtype=np.float64).reshape(-1, 2)
+    return None
+
+
+def project(latlng):
+    """Equirectangular projection of lat/lng to meters, fine at city scale"""
+    if not len(latlng):
+        return np.zeros((0, 2))
+    lat0 = np.radians(latlng[:, 0].mean())
+    rad = np.radians(latlng)
+    return np.column_stack((rad[:, 1] * np.cos(lat0), rad[:, 0])) * EARTH_RADIUS_M
+
+
+def segment_distance(points, a, b):
+    """Distance in meters from each point to the segment a-b on the same row"""
+    ab = b - a
+    ap = points - a
+    length2 = (ab * ab).sum(axis=1)
+    t = np.clip((ap * ab).sum(axis=1) / np.where(length2 > 0, length2, 1), 0, 1)
+    return np.hypot(*(ap - t[:, None] * ab).T)
+
+
+def douglas_peucker(xy, fixed, tolerance):
+    """Keep mask simplifying xy (meters) with Douglas-Peucker
+
+    Points in fixed are always kept; passing every line's first and last
+    point lets many lines be simplified in one call. Instead of recursing
+    per segment, each pass measures every open point against the segment
+    between its kept neighbours at once. The farthest point of a segment is
+    kept if it's beyond tolerance; otherwise the whole segment is dropped.
+    """
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[fixed] = True
+    pending = ~keep
+    while pending.any():
+        kept = np.flatnonzero(keep)
+        points = np.flatnonzero(pending)
+        segment = np.searchsorted(kept, points) - 1
+        distance = segment_distance(xy[points], xy[kept[segment]], xy[kept[segment + 1]])
+
+        # points are sorted, so each segment's points are contiguous
+        starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+        counts = np.diff(np.r_[starts, len(points)])
+        farthest = np.maximum.reduceat(distance, starts)
+        at_max = np.flatnonzero(distance == np.repeat(farthest, counts))
+        at_max = points[at_max[np.r_[True, np.diff(segment[at_max]) != 0]]]  # one per segment
+
+        split = farthest > tolerance
+        pending[points[~np.repeat(split, counts)]] = False
+        keep[at_max[split]] = True
+        pending[at_max[split]] = False
+    return keep
+
+
+def visvalingam(xy, fixed, tolerance):
+    """Keep mask simplifying xy (meters) with Visvalingam-Whyatt
+
+    Drops points whose triangle with their kept neighbours is smaller than
+    tolerance² m². The textbook version removes the smallest triangle one
+    at a time from a heap; here each pass removes every triangle under the
+    threshold that is smaller than both neighbouring ones, so no two
+    adjacent points go at once, then recomputes the areas of what's left.
+    """
+    keep = np.ones(len(xy), dtype=bool)
+    locked = np.zeros(len(xy), dtype=bool)
+    locked[fixed] = True
+    threshold = tolerance ** 2
+    while True:
+        kept = np.flatnonzero(keep)
+        area = np.full(len(kept), np.inf)
+        inner = np.flatnonzero(~locked[kept])
+        a, b, c = xy[kept[inner - 1]], xy[kept[inner]], xy[kept[inner + 1]]
+        area[inner] = 0.5 * np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])
+                                   - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]))
+        drop = (area < threshold) & (area < np.r_[np.inf, area[:-1]]) & (area <= np.r_[area[1:], np.inf])
+        if not drop.any():
+            return keep
+        keep[kept[drop]] = False
+
+
+SIMPLIFIERS = {"dp": douglas_peucker, "vw": visvalingam}
+
+
+def simplify_lines(lines, method="dp", tolerance=DEFAULT_TOLERANCE_M):
+    """Simplify lat/lng lines once per zoom range in LOD_LEVELS
+
+    All lines are projected and simplified together. Returns one dict per
+    level with its zoom range, tolerance in meters, the kept lat/lng
+    "coords" and uint32 "offsets" of each line in them. With method "none"
+    there is a single level with every point, for all zooms.
+    """
+    lengths = np.array([len(line) for line in lines], dtype=np.int64)
+    coords = np.concatenate(lines) if lines else np.zeros((0, 2))
+    if method == "none":
+        return [{"min_zoom": 0, "max_zoom": LOD_LEVELS[-1][1], "tolerance": 0.0, "coords": coords,
+                 "offsets": np.r_[0, np.cumsum(lengths)].astype(np.uint32)}]
+
+    xy = project(coords)
+    ends = np.cumsum(lengths)
+    fixed = np.r_[ends - lengths, ends - 1][np.r_[lengths, lengths] > 0]
+    line_of = np.repeat(np.arange(len(lines)), lengths)
+    levels = []
+    for min_zoom, max_zoom, multiple in LOD_LEVELS:
+        level_tolerance = tolerance * multiple
+        keep = SIMPLIFIERS[method](xy, fixed, level_tolerance)
+        counts = np.bincount(line_of[keep], minlength=len(lines))
+        levels.append({"min_zoom": min_zoom, "max_zoom": max_zoom, "tolerance": level_tolerance,
+                       "coords": coords[keep], "offsets": np.r_[0, np.cumsum(counts)].astype(np.uint32)})
+    return levels
+
+
+def print_levels(levels, total_points):
+    """Print how many route points each detail level keeps"""
+    for level in levels:
+        kept = len(level["coords"])
+        dropped = 1 - kept / total_points if total_points else 0
+        print(f"  zoom {level['min_zoom']}-{level['max_zoom']} (tolerance {level['tolerance']:g} m): "
+              f"{kept:,} of {total_points:,} route points ({dropped:.1%} dropped)")
+
+
+def add_route_levels(m, parent, levels, polylines):
+    """Add each detail level's route polylines to parent, showing only the current zoom's
+
+    polylines holds the folium.PolyLine options of each route, in line
+    order. Every level gets its own sub-layer; a small script swaps them
+    on zoomend.
+    """
+    import folium
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    switch = MacroElement()
+    switch._name = "ZoomLevels"
+    switch._template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var group = {{ this._parent.get_name() }};
+            var levels = [{% for min_zoom, max_zoom, layer in this.levels %}
+                [{{ min_zoom }}, {{ max_zoom }}, {{ layer.get_name() }}],{% endfor %}
+            ];
+            function showLevel() {
+                var zoom = {{ this.map.get_name() }}.getZoom();
+                levels.forEach(function(level) {
+                    if (zoom >= level[0] && zoom <= level[1]) group.addLayer(level[2]);
+                    else group.removeLayer(level[2]);
+                });
+            }
+            {{ this.map.get_name() }}.on("zoomend", showLevel);
+            showLevel();
+        })();
+        {% endmacro %}
+    """)
+    switch.map, switch.levels = m, []
+
+    for level in levels:
+        layer = folium.FeatureGroup(control=False).add_to(parent)
+        offsets = level["offsets"]
+        coords = np.round(level["coords"], 6)
+        for i, options in enumerate(polylines):
+            folium.PolyLine(coords[offsets[i]:offsets[i + 1]].tolist(), **options).add_to(layer)
+        switch.levels.append((level["min_zoom"], level["max_zoom"], layer))
+    switch.add_to(parent)
+
+
+def render_single(request_data, api_response, output_file=OUTPUT_FILE, method="dp", tolerance=DEFAULT_TOLERANCE_M):
+    """Map one request: the user's start/end, the first matched route and the walks"""
+    import folium
+
+    # Create a map centered between start and end points
+    center_lat = (request_data["start_lat"] + request_data["end_lat"]) / 2
+    center_lng = (request_data["start_lng"] + request_data["end_lng"]) / 2
+    m = folium.Map(location=[center_lat, center_lng], zoom_start=13)
+
+    # 1. Plot User Requested Start/End Points (Blue Markers)
     folium.Marker(
-        [lat, lng],
-        popup=popup_text,
-        icon=folium.Icon(color=color, icon=icon)
+        [request_data["start_lat"], request_data["start_lng"]],
+        popup="User Start Location",
+        icon=folium.Icon(color="blue", icon="user")
+    ).add_to(m)
+
+    folium.Marker(
+        [request_data["end_lat"], request_data["end_lng"]],
+        popup="User Destination",
+        icon=folium.Icon(color="blue", icon="flag")
+    ).add_to(m)
+
+    # 2. Plot Matched Route
+    route = api_response["matched_routes"][0]
+    route_coordinates = []
+
+    for stop in route["stops"]:
+        lat = float(stop["latitude"])
+        lng = float(stop["longitude"])
+        route_coordinates.append([lat, lng])
+
+        # Color code stops: Green for pickup, Red for dropoff, Gray for others
+        color = "gray"
+        icon = "info-sign"
+        popup_text = f"{stop['name']} (Order: {stop['pivot']['order']})"
+
+        if stop["id"] == api_response["start_stop"]["id"]:
+            color = "green"
+            icon = "play"
+            popup_text = f"PICKUP: {stop['name']}"
+        elif stop["id"] == api_response["end_stop"]["id"]:
+            color = "red"
+            icon = "stop"
+            popup_text = f"DROPOFF: {stop['name']}"
+
+        folium.Marker(
+            [lat, lng],
+            popup=popup_text,
+            icon=folium.Icon(color=color, icon=icon)
+        ).add_to(m)
+
+    # Draw the route path, along the road when the route has its geometry
+    geometry = route_geometry(route)
+    line = geometry if geometry is not None else np.array(route_coordinates)
+    levels = simplify_lines([line], method, tolerance)
+    print_levels(levels, len(line))
+    route_layer = folium.FeatureGroup(name=route["name"]).add_to(m)
+    add_route_levels(m, route_layer, levels, [dict(
+        color="purple",
+        weight=5,
+        opacity=0.7,
+        tooltip=route["name"]
+    )])
+
+    # 3. Draw Walking Lines (Dashed)
+    # Walk to Pickup
+    pickup_lat = float(api_response["start_stop"]["latitude"])
+    pickup_lng = float(api_response["start_stop"]["longitude"])
+    folium.PolyLine(
+        [[request_data["start_lat"], request_data["start_lng"]], [pickup_lat, pickup_lng]],
+        color="green",
+        weight=3,
+        dash_array="5, 10",
+        tooltip="Walk to Pickup"
+    ).add_to(m)
+
+    # Walk from Dropoff
+    dropoff_lat = float(api_response["end_stop"]["latitude"])
+    dropoff_lng = float(api_response["end_stop"]["longitude"])
+    folium.PolyLine(
+        [[dropoff_lat, dropoff_lng], [request_data["end_lat"], request_data["end_lng"]]],
+        color="red",
+        weight=3,
+        dash_array="5, 10",
+        tooltip="Walk to Destination"
     ).add_to(m)
 
-# Draw the route path
-folium.PolyLine(
-    route_coordinates,
-    color="purple",
-    weight=5,
-    opacity=0.7,
-    tooltip=route["name"]
-).add_to(m)
-
-# 3. Draw Walking Lines (Dashed)
-# Walk to Pickup
-pickup_lat = float(api_response["start_stop"]["latitude"])
-pickup_lng = float(api_response["start_stop"]["longitude"])
-folium.PolyLine(
-    [[request_data["start_lat"], request_data["start_lng"]], [pickup_lat, pickup_lng]],
-    color="green",
-    weight=3,
-    dash_array="5, 10",
-    tooltip="Walk to Pickup"
-).add_to(m)
-
-# Walk from Dropoff
-dropoff_lat = float(api_response["end_stop"]["latitude"])
-dropoff_lng = float(api_response["end_stop"]["longitude"])
-folium.PolyLine(
-    [[dropoff_lat, dropoff_lng], [request_data["end_lat"], request_data["end_lng"]]],
-    color="red",
-    weight=3,
-    dash_array="5, 10",
-    tooltip="Walk to Destination"
-).add_to(m)
-
-# Save map
-output_file = "shuttle_route_map.html"
-m.save(output_file)
-print(f"Map saved to {output_file}")
+    # Save map
+    m.save(output_file)
+    print(f"Map saved to {output_file} ({os.path.getsize(output_file):,} bytes)")
+
+
+def read_request_log(path):
+    """Yield (request, response) pairs from a JSONL log, one object per line
+
+    Each line holds the request body under "request" (or "request_data") and
+    the API response under "response" (or "api_response"). Blank and
+    malformed lines are skipped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number}: {e}")
+                continue
+            yield (entry.get("request") or entry.get("request_data") or {},
+                   entry.get("response") or entry.get("api_response") or {})
+
+
+def response_matches(response):
+    """(route, start stop, end stop) for each route in a match-route response
+
+    ShuttleController::matchRoute returns "matches": [{"route", "start_stop",
+    "end_stop", ...}], best first. Older logs have "matched_routes" with a
+    single start_stop/end_stop at the top level, which belong to the first
+    route; later routes get None. Unsuccessful responses have no matches.
+    """
+    if not response.get("success"):
+        return []
+    if response.get("matches"):
+        return [(match["route"], match.get("start_stop"), match.get("end_stop")) for match in response["matches"]]
+    return [(route, response.get("start_stop"), response.get("end_stop")) if i == 0 else (route, None, None)
+            for i, route in enumerate(response.get("matched_routes") or [])]
+
+
+def aggregate_requests(pairs):
+    """Collect the unique stops and routes of a request log in one pass
+
+    Returns (stops, routes, origins, destinations, totals). Stops and routes
+    are keyed by id, so a stop shared by many routes or a route matched by
+    many requests is kept once, with counts of how often it was used.
+    """
+    stops = {}   # id -> {"lat", "lng", "name", "pickups", "dropoffs"}
+    routes = {}  # id -> {"name", "code", "stop_ids", "geometry", "matches"}
+    origins, destinations = [], []
+    totals = {"requests": 0, "matched": 0}
+
+    def add_stop(stop):
+        entry = stops.get(stop["id"])
+        if entry is None:
+            entry = stops[stop["id"]] = {"lat": float(stop["latitude"]), "lng": float(stop["longitude"]),
+                                         "name": stop["name"], "pickups": 0, "dropoffs": 0}
+        return entry
+
+    for request, response in pairs:
+        totals["requests"] += 1
+        if "start_lat" in request:
+            origins.append([request["start_lat"], request["start_lng"]])
+            destinations.append([request["end_lat"], request["end_lng"]])
+
+        matches = response_matches(response)
+        if not matches:
+            continue
+        totals["matched"] += 1
+
+        # Pickups and dropoffs of the best match, the one the rider is offered
+        _, start_stop, end_stop = matches[0]
+        if start_stop:
+            add_stop(start_stop)["pickups"] += 1
+        if end_stop:
+            add_stop(end_stop)["dropoffs"] += 1
+
+        for route, _, _ in matches:
+            entry = routes.get(route["id"])
+            if entry is None:
+                ordered = sorted(route["stops"], key=lambda stop: stop["pivot"]["order"])
+                for stop in ordered:
+                    add_stop(stop)
+                entry = routes[route["id"]] = {
+                    "name": route["name"],
+                    "code": route.get("code", ""),
+                    "stop_ids": [stop["id"] for stop in ordered],
+                    "geometry": route_geometry(route),
+                    "matches": 0,
+                }
+            entry["matches"] += 1
+
+    return stops, routes, origins, destinations, totals
+
+
+def render_batch(log_path, output_file=BATCH_OUTPUT_FILE, method="dp", tolerance=DEFAULT_TOLERANCE_M):
+    """Map every matched route in a request log
+
+    One polyline per unique route and detail level, and one marker per
+    unique stop, clustered.
+    Request origins and destinations go into FastMarkerCluster layers, which
+    build their markers in the browser, so large logs still open quickly.
+    Walking lines are left out at this scale.
+    """
+    import folium
+    from folium.plugins import FastMarkerCluster, MarkerCluster
+
+    stops, routes, origins, destinations, totals = aggregate_requests(read_request_log(log_path))
+    print(f"{totals['requests']} requests, {totals['matched']} matched, "
+          f"{len(routes)} unique routes, {len(stops)} unique stops")
+
+    points = [[stop["lat"], stop["lng"]] for stop in stops.values()] + origins + destinations
+    if not points:
+        print(f"No requests in {log_path}, nothing to map")
+        return
+    lats = [lat for lat, _ in points]
+    lngs = [lng for _, lng in points]
+    m = folium.Map(location=[sum(lats) / len(lats), sum(lngs) / len(lngs)], zoom_start=12)
+    m.fit_bounds([[min(lats), min(lngs)], [max(lats), max(lngs)]])
+
+    # 1. Matched routes, heavier for routes matched more often
+    lines = route_lines(stops, routes)
+    levels = simplify_lines(lines, method, tolerance)
+    print_levels(levels, sum(len(line) for line in lines))
+    most_matches = max((route["matches"] for route in routes.values()), default=1)
+    route_layer = folium.FeatureGroup(name="Matched routes").add_to(m)
+    add_route_levels(m, route_layer, levels, [dict(
+        color="purple",
+        weight=2 + 6 * route["matches"] / most_matches,
+        opacity=0.7,
+        tooltip=f"{route['name']} ({route['matches']} matches)"
+    ) for route in routes.values()])
+
+    # 2. Stops: Green if ever a pickup, Red if only a dropoff, Gray otherwise
+    stop_layer = MarkerCluster(name="Stops").add_to(m)
+    for stop in stops.values():
+        color, icon = "gray", "info-sign"
+        if stop["pickups"]:
+            color, icon = "green", "play"
+        elif stop["dropoffs"]:
+            color, icon = "red", "stop"
+        folium.Marker(
+            [stop["lat"], stop["lng"]],
+            popup=f"{stop['name']}<br>Pickups: {stop['pickups']}<br>Dropoffs: {stop['dropoffs']}",
+            icon=folium.Icon(color=color, icon=icon)
+        ).add_to(stop_layer)
+
+    # 3. User requested start/end points
+    if origins:
+        FastMarkerCluster(origins, name="User start locations").add_to(m)
+        FastMarkerCluster(destinations, name="User destinations").add_to(m)
+
+    folium.LayerControl().add_to(m)
+    m.save(output_file)
+    print(f"Map saved to {output_file} ({os.path.getsize(output_file):,} bytes)")
+
+
+def route_lines(stops, routes):
+    """One lat/lng array per route: its road geometry if logged, else its stops in order"""
+    return [route["geometry"] if route["geometry"] is not None
+            else np.array([[stops[stop_id]["lat"], stops[stop_id]["lng"]] for stop_id in route["stop_ids"]])
+            for route in routes.values()]
+
+
+def to_arrays(stops, routes, origins, destinations, method="dp", tolerance=DEFAULT_TOLERANCE_M):
+    """Turn aggregated stops/routes into flat arrays for the compact writers
+
+    Stop coordinates become float arrays once; route lines are simplified
+    into the detail levels of simplify_lines(), each one array of points
+    with per-route offsets into it.
+    """
+    lines = route_lines(stops, routes)
+    levels = simplify_lines(lines, method, tolerance)
+    print_levels(levels, sum(len(line) for line in lines))
+    return {
+        "stop_ids": list(stops),
+        "stop_lat": np.array([stop["lat"] for stop in stops.values()], dtype=np.float64),
+        "stop_lng": np.array([stop["lng"] for stop in stops.values()], dtype=np.float64),
+        "levels": levels,
+        "origins": np.array(origins, dtype=np.float64).reshape(-1, 2),
+        "destinations": np.array(destinations, dtype=np.float64).reshape(-1, 2),
+    }
+
+
+def write_geojson(stops, routes, arrays, totals, output_file):
+    """Write stops, routes and request points as one compact GeoJSON FeatureCollection
+
+    Each route has one LineString feature per detail level, with the
+    level's zoom range in min_zoom/max_zoom.
+    """
+    # GeoJSON is [lng, lat]; 6 decimals is ~10cm
+    stop_coords = np.round(np.column_stack((arrays["stop_lng"], arrays["stop_lat"])), 6).tolist()
+    features = []
+    for level in arrays["levels"]:
+        offsets = level["offsets"]
+        coords = np.round(level["coords"][:, ::-1], 6).tolist()
+        for i, (route_id, route) in enumerate(routes.items()):
+            features.append({
+                "type": "Feature",
+                "properties": {"kind": "route", "id": route_id, "name": route["name"],
+                               "code": route["code"], "matches": route["matches"],
+                               "min_zoom": level["min_zoom"], "max_zoom": level["max_zoom"]},
+                "geometry": {"type": "LineString", "coordinates": coords[offsets[i]:offsets[i + 1]]},
+            })
+    for coords, (stop_id, stop) in zip(stop_coords, stops.items()):
+        features.append({
+            "type": "Feature",
+            "properties": {"kind": "stop", "id": stop_id, "name": stop["name"],
+                           "pickups": stop["pickups"], "dropoffs": stop["dropoffs"]},
+            "geometry": {"type": "Point", "coordinates": coords},
+        })
+    for kind in ("origins", "destinations"):
+        if len(arrays[kind]):
+            features.append({
+                "type": "Feature",
+                "properties": {"kind": kind},
+                "geometry": {"type": "MultiPoint", "coordinates": np.round(arrays[kind][:, ::-1], 6).tolist()},
+            })
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "properties": totals, "features": features},
+                  f, separators=(",", ":"), ensure_ascii=False)
+
+
+def write_binary(stops, routes, arrays, totals, output_file):
+    """Write stops, routes and request points as packed little-endian arrays
+
+    Layout: b"SRPK", uint32 version, uint32 metadata length, UTF-8 JSON
+    metadata (padded to 4 bytes), then each section listed in
+    metadata["sections"] back to back. Coordinates are float32 lat/lng
+    pairs (~0.2m at Cairo's latitude). Each detail level i listed in
+    metadata["levels"] has route_coords_i, the points of every route, and
+    route_offsets_i, the uint32 point index where each route starts.
+    """
+    sections = [("stops", np.column_stack((arrays["stop_lat"], arrays["stop_lng"])).astype("<f4"))]
+    for i, level in enumerate(arrays["levels"]):
+        sections += [(f"route_offsets_{i}", level["offsets"].astype("<u4")),
+                     (f"route_coords_{i}", level["coords"].astype("<f4"))]
+    sections += [("origins", arrays["origins"].astype("<f4")),
+                 ("destinations", arrays["destinations"].astype("<f4"))]
+    metadata = {
+        "totals": totals,
+        "stops": {"ids": arrays["stop_ids"],
+                  "names": [stop["name"] for stop in stops.values()],
+                  "pickups": [stop["pickups"] for stop in stops.values()],
+                  "dropoffs": [stop["dropoffs"] for stop in stops.values()]},
+        "routes": [{"id": route_id, "name": route["name"], "code": route["code"], "matches": route["matches"]}
+                   for route_id, route in routes.items()],
+        "levels": [{"min_zoom": level["min_zoom"], "max_zoom": level["max_zoom"], "tolerance": level["tolerance"]}
+                   for level in arrays["levels"]],
+        "sections": [{"name": name, "type": "float32" if data.dtype.kind == "f" else "uint32", "length": data.size}
+                     for name, data in sections],
+    }
+    header = json.dumps(metadata, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+
+    with open(output_file, "wb") as f:
+        f.write(BINARY_MAGIC)
+        f.write(np.array([BINARY_VERSION, len(header)], dtype="<u4").tobytes())
+        f.write(header)
+        for _, data in sections:
+            f.write(data.tobytes())
+
+
+VIEWER_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Shuttle routes</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map {{ height: 100%; margin: 0; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+// Data file to load; override with ?data=other.geojson or ?data=other.bin
+const DATA = new URLSearchParams(location.search).get("data") || {data_file};
+const map = L.map("map", {{preferCanvas: true}}).setView([30.06, 31.28], 12);
+L.tileLayer("https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png",
+            {{attribution: "&copy; OpenStreetMap contributors"}}).addTo(map);
+const layers = {{
+  "Matched routes": L.layerGroup().addTo(map), "Stops": L.layerGroup().addTo(map),
+  "User start locations": L.layerGroup().addTo(map), "User destinations": L.layerGroup().addTo(map),
+}};
+L.control.layers(null, layers).addTo(map);
+
+function stopColor(pickups, dropoffs) {{ return pickups ? "green" : dropoffs ? "red" : "gray"; }}
+
+// levels: [{{min_zoom, max_zoom, routes: [{{name, matches, coords}}]}}], only the current zoom's is shown
+function draw(stops, levels, origins, destinations) {{
+  const most = Math.max(1, ...levels.flatMap(level => level.routes.map(r => r.matches)));
+  for (const level of levels) {{
+    level.layer = L.layerGroup();
+    for (const r of level.routes)
+      L.polyline(r.coords, {{color: "purple", weight: 2 + 6 * r.matches / most, opacity: 0.7}})
+        .bindTooltip(`${{r.name}} (${{r.matches}} matches)`).addTo(level.layer);
+  }}
+  const showLevel = () => {{
+    const zoom = map.getZoom();
+    layers["Matched routes"].clearLayers();
+    for (const level of levels)
+      if (zoom >= level.min_zoom && zoom <= level.max_zoom) layers["Matched routes"].addLayer(level.layer);
+  }};
+  map.on("zoomend", showLevel);
+  for (const s of stops)
+    L.circleMarker(s.coords, {{radius: 6, color: stopColor(s.pickups, s.dropoffs), fillOpacity: 0.8}})
+      .bindPopup(`${{s.name}}<br>Pickups: ${{s.pickups}}<br>Dropoffs: ${{s.dropoffs}}`).addTo(layers["Stops"]);
+  for (const [points, layer, color] of [[origins, "User start locations", "blue"], [destinations, "User destinations", "orange"]])
+    for (const p of points) L.circleMarker(p, {{radius: 2, color, weight: 1}}).addTo(layers[layer]);
+  const all = stops.map(s => s.coords).concat(origins, destinations);
+  if (all.length) map.fitBounds(all);
+  showLevel();
+}}
+
+function fromGeoJSON(data) {{
+  const stops = [], levels = {{}};
+  let origins = [], destinations = [];
+  const latLng = c => [c[1], c[0]];
+  for (const f of data.features) {{
+    const p = f.properties, g = f.geometry;
+    if (p.kind === "route")
+      (levels[`${{p.min_zoom}}-${{p.max_zoom}}`] ??= {{min_zoom: p.min_zoom, max_zoom: p.max_zoom, routes: []}})
+        .routes.push({{...p, coords: g.coordinates.map(latLng)}});
+    else if (p.kind === "stop") stops.push({{...p, coords: latLng(g.coordinates)}});
+    else if (p.kind === "origins") origins = g.coordinates.map(latLng);
+    else if (p.kind === "destinations") destinations = g.coordinates.map(latLng);
+  }}
+  draw(stops, Object.values(levels), origins, destinations);
+}}
+
+function fromBinary(buffer) {{
+  const view = new DataView(buffer);
+  if (new TextDecoder().decode(new Uint8Array(buffer, 0, 4)) !== "SRPK") throw new Error("Not a route pack");
+  const metaLength = view.getUint32(8, true);
+  const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, metaLength)));
+  const sections = {{}};
+  let offset = 12 + metaLength;
+  for (const s of meta.sections) {{
+    sections[s.name] = new (s.type === "float32" ? Float32Array : Uint32Array)(buffer, offset, s.length);
+    offset += s.length * 4;
+  }}
+  const pairs = a => Array.from({{length: a.length / 2}}, (_, i) => [a[2 * i], a[2 * i + 1]]);
+  const stopCoords = pairs(sections.stops);
+  const stops = stopCoords.map((coords, i) => ({{
+    coords, name: meta.stops.names[i], pickups: meta.stops.pickups[i], dropoffs: meta.stops.dropoffs[i]}}));
+  const levels = meta.levels.map((level, l) => {{
+    const offsets = sections[`route_offsets_${{l}}`], coords = sections[`route_coords_${{l}}`];
+    return {{...level, routes: meta.routes.map((r, i) => ({{
+      ...r, coords: pairs(coords.subarray(2 * offsets[i], 2 * offsets[i + 1]))}}))}};
+  }});
+  draw(stops, levels, pairs(sections.origins), pairs(sections.destinations));
+}}
+
+fetch(DATA).then(response => {{
+  if (!response.ok) throw new Error(`${{DATA}}: HTTP ${{response.status}}`);
+  return DATA.endsWith(".bin") ? response.arrayBuffer().then(fromBinary) : response.json().then(fromGeoJSON);
+}}).catch(error => alert(`Could not load ${{DATA}}: ${{error.message}}`));
+</script>
+</body>
+</html>
+"""
+
+
+def write_viewer(data_file):
+    """Write the static viewer page next to a data file, pointing at it"""
+    viewer_path = os.path.join(os.path.dirname(os.path.abspath(data_file)), VIEWER_FILE)
+    with open(viewer_path, "w", encoding="utf-8") as f:
+        f.write(VIEWER_TEMPLATE.format(data_file=json.dumps(os.path.basename(data_file))))
+    return viewer_path
+
+
+def export_data(pairs, output_file, output_format, method="dp", tolerance=DEFAULT_TOLERANCE_M):
+    """Headless output: compact GeoJSON or binary data plus the viewer, no folium"""
+    stops, routes, origins, destinations, totals = aggregate_requests(pairs)
+    print(f"{totals['requests']} requests, {totals['matched']} matched, "
+          f"{len(routes)} unique routes, {len(stops)} unique stops")
+    arrays = to_arrays(stops, routes, origins, destinations, method, tolerance)
+    writer = write_geojson if output_format == "geojson" else write_binary
+    writer(stops, routes, arrays, totals, output_file)
+    viewer_path = write_viewer(output_file)
+    print(f"Data saved to {output_file} ({os.path.getsize(output_file):,} bytes), viewer: {viewer_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot shuttle match-route results on a map")
+    parser.add_argument("--batch", metavar="LOG", help="JSONL log of request/response pairs to map together")
+    parser.add_argument("--format", choices=list(OUTPUT_EXTENSIONS), default="html",
+                        help="html renders a folium map; geojson and binary write compact data "
+                             f"for {VIEWER_FILE} without importing folium")
+    parser.add_argument("-o", "--output", help=f"Output file (default: {OUTPUT_FILE}, "
+                                               f"or {BATCH_OUTPUT_FILE} with --batch; "
+                                               "extension follows --format)")
+    parser.add_argument("--simplify", choices=list(SIMPLIFIERS) + ["none"], default="dp",
+                        help="Route simplification: Douglas-Peucker, Visvalingam-Whyatt, "
+                             "or none for every point at all zooms")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE_M,
+                        help="Allowed route error in meters at zoom 16, doubled per zoom level out "
+                             f"(default: {DEFAULT_TOLERANCE_M:g})")
+    args = parser.parse_args()
+
+    default = BATCH_OUTPUT_FILE if args.batch else OUTPUT_FILE
+    output_file = args.output or os.path.splitext(default)[0] + OUTPUT_EXTENSIONS[args.format]
+
+    if args.format != "html":
+        pairs = read_request_log(args.batch) if args.batch else [(request_data, api_response)]
+        export_data(pairs, output_file, args.format, args.simplify, args.tolerance)
+    elif args.batch:
+        render_batch(args.batch, output_file, args.simplify, args.tolerance)
+    else:
+        render_single(request_data, api_response, output_file, args.simplify, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()